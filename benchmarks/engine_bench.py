@@ -0,0 +1,183 @@
+#! /usr/bin/python3
+import os
+import sys
+import time
+import json
+import platform
+import argparse
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')))
+from strategy.tick_record import TickRecord
+from strategy.mock_client import MockClient
+from strategy.grid_v1 import GridRun
+from strategy.file_cache import FileCache
+from strategy.mem_cache import MemCache
+from strategy.journal_cache import JournalCache
+from strategy.order_record import OrderRecord
+from price_paths import PATHS, write_path_record
+
+config = {
+    "strategy_id": "bench",
+    "low_bound": 150,
+    "up_bound": 400,
+    "total_cash": 1250,
+    "grid_num": 110,
+    "target_symbol": "BNB",
+    "base_symbol": "USDT",
+    "price_round_num": 2,
+    "quantity_round_num": 4,
+    "sell_greedy_x": 1.003,
+    "buy_greedy_x": 1.0,
+    "grid_mode": "equal_percent",
+    "run_target": "join",
+    "strategy_type": "grid_v1",
+    "cache_type": "mem"
+}
+
+def bench_replay(record_file, config):
+    # GridRun over MockClient, check_and_commit timed as the reconcile cost
+    record = TickRecord(record_file, max_line = None)
+    mock_client = MockClient(record, 'BNB', 'USDT')
+    runner = GridRun(client = mock_client, config = dict(config), verbose = False)
+    runner.order_sleep = 0.
+    reconcile = [0, 0.]
+    check_and_commit = runner.check_and_commit
+    def timed_check_and_commit(*args, **kwargs):
+        st = time.time()
+        try:
+            return check_and_commit(*args, **kwargs)
+        finally:
+            reconcile[0] += 1
+            reconcile[1] += time.time() - st
+    runner.check_and_commit = timed_check_and_commit
+    st = time.time()
+    events = 0
+    while mock_client.has_next():
+        runner.work_loop()
+        mock_client.next_event()
+        events += 1
+    el = time.time() - st
+    return {
+        'ticks': len(record),
+        'events': events,
+        'seconds': el,
+        'ticks_per_second': len(record) / el,
+        'reconciles': reconcile[0],
+        'reconcile_ms': reconcile[1] * 1000. / max(reconcile[0], 1),
+        'gain': runner.get_total_gain(),
+    }
+
+def new_cache(cache_type, name):
+    if cache_type == 'file':
+        return FileCache(name)
+    if cache_type == 'journal':
+        return JournalCache(name)
+    return MemCache()
+
+def remove_cache(cache):
+    for attr in ('cache_file_name', 'snap_file_name', 'journal_file_name'):
+        fn = getattr(cache, attr, None)
+        if fn and os.path.exists(fn):
+            os.remove(fn)
+
+def bench_cache(cache_type, order_num, saves = 200):
+    # one fill per save: one order leaves, one comes, the gain changes
+    name = 'bench_cache_%s_%s' % (cache_type, order_num)
+    cache = new_cache(cache_type, name)
+    orders = [OrderRecord('bench_%d_0_1000_%d_BUY' % (i, i), 'BUY', i, 0.1, 150. + i * 0.1)
+              for i in range(order_num)]
+    content = {'open_orders': [od.dump() for od in orders], 'total_gain': 0., 'unique_order_id': order_num}
+    cache.save_local_cache(content)
+    save_el = 0.
+    for i in range(saves):
+        od = orders.pop(0)
+        orders.append(OrderRecord('bench_%d_0_1000_%d_SELL' % (od.flag_id + 1, order_num + i), 'SELL',
+                                  od.flag_id + 1, 0.1, od.price * 1.003))
+        content = dict(content)
+        content['open_orders'] = [od.dump() for od in orders]
+        content['total_gain'] += 0.01
+        content['unique_order_id'] += 1
+        st = time.time()
+        cache.save_local_cache(content)
+        save_el += time.time() - st
+    if hasattr(cache, 'sync'):
+        cache.sync()
+    st = time.time()
+    loaded = new_cache(cache_type, name) if cache_type != 'mem' else cache
+    loaded.get_local_cache()
+    load_el = time.time() - st
+    remove_cache(cache)
+    return {
+        'cache_type': cache_type,
+        'orders': order_num,
+        'saves': saves,
+        'save_us': save_el * 1e6 / saves,
+        'load_us': load_el * 1e6,
+    }
+
+def compare(old_file, result):
+    # throughput of this run against an old result file
+    with open(old_file, 'r') as fh:
+        old = json.loads(fh.read())
+    keys = {
+        'replay': (('path', 'ticks'), 'ticks_per_second', 1),
+        'reconcile': (('grid_num', ), 'reconcile_ms', -1),
+        'cache': (('cache_type', 'orders'), 'save_us', -1),
+    }
+    for section, (key_fields, field, sign) in keys.items():
+        old_map = dict((tuple(r[k] for k in key_fields), r[field]) for r in old.get(section, []))
+        for r in result.get(section, []):
+            key = tuple(r[k] for k in key_fields)
+            if key not in old_map or not old_map[key] or not r[field]:
+                continue
+            speedup = (r[field] / old_map[key]) ** sign
+            print('%s %s %s: %.4g -> %.4g speedup %.2fx' % (section, key, field, old_map[key], r[field], speedup))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default = '10000,100000', help = 'tick numbers of the replay paths')
+    parser.add_argument('--paths', default = ','.join(PATHS.keys()))
+    parser.add_argument('--grid_nums', default = '10,50,100,500,1000', help = 'grid_num of the reconcile scaling')
+    parser.add_argument('--orders', default = '100,1000', help = 'open orders of the cache benchmark')
+    parser.add_argument('--seed', type = int, default = 1)
+    parser.add_argument('--output', default = 'engine_bench.json')
+    parser.add_argument('--compare', default = None, help = 'an older output to compare with')
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',')]
+    result = {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'seed': args.seed,
+        'replay': [],
+        'reconcile': [],
+        'cache': [],
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for path in args.paths.split(','):
+            for tick_num in sizes:
+                record_file = write_path_record(os.path.join(tmp_dir, '%s_%s.grec' % (path, tick_num)),
+                                                path, tick_num, args.seed)
+                r = bench_replay(record_file, config)
+                r.update({'path': path, 'grid_num': config['grid_num']})
+                print('replay', json.dumps(r))
+                result['replay'].append(r)
+        # wide bounds so 1000 grids are not too crowd, about a fifth of them
+        # lies in the price range of the path
+        record_file = write_path_record(os.path.join(tmp_dir, 'reconcile.grec'), 'random_walk', sizes[0], args.seed)
+        for grid_num in [int(s) for s in args.grid_nums.split(',')]:
+            cfg = dict(config, low_bound = 50, up_bound = 5000, grid_num = grid_num, total_cash = 10 * grid_num)
+            r = bench_replay(record_file, cfg)
+            r.update({'path': 'random_walk', 'grid_num': grid_num})
+            print('reconcile', json.dumps(r))
+            result['reconcile'].append(r)
+    for cache_type in ('mem', 'file', 'journal'):
+        for order_num in [int(s) for s in args.orders.split(',')]:
+            r = bench_cache(cache_type, order_num)
+            print('cache', json.dumps(r))
+            result['cache'].append(r)
+    with open(args.output, 'w') as fh:
+        fh.write(json.dumps(result, indent = 4) + '\n')
+    print('result saved to %s' % args.output)
+    if args.compare:
+        compare(args.compare, result)
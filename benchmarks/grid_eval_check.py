@@ -0,0 +1,60 @@
+#! /usr/bin/python3
+import os
+import sys
+import time
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')))
+from strategy.tick_record import TickRecord
+from strategy.mock_client import MockClient
+from strategy.sweep import expand_grid, run_backtest
+from strategy.grid_eval import eval_grid
+from mock_client_bench import gen_record
+
+config = {
+    "strategy_id": "check",
+    "low_bound": 150,
+    "up_bound": 400,
+    "total_cash": 1250,
+    "grid_num": 110,
+    "target_symbol": "BNB",
+    "base_symbol": "USDT",
+    "price_round_num": 2,
+    "quantity_round_num": 4,
+    "sell_greedy_x": 1.0,
+    "buy_greedy_x": 1.0,
+    "grid_mode": "equal_percent",
+    "run_target": "join",
+    "strategy_type": "grid_v1",
+    "cache_type": "mem"
+}
+
+if __name__ == '__main__':
+    tick_num = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        record_file = os.path.join(tmp_dir, 'check.record')
+        gen_record(record_file, tick_num)
+        record = TickRecord(record_file, max_line = None)
+        trade_fee = MockClient(record, 'BNB', 'USDT').trade_fee()
+        grid = {
+            'grid_num': [20, 55, 110],
+            'sell_greedy_x': [1.0, 1.003],
+            'buy_greedy_x': [1.0, 0.998],
+            'grid_mode': ['equal_percent', 'equal_delta'],
+        }
+        max_diff = 0.
+        for cfg in expand_grid(config, grid):
+            try:
+                gain = run_backtest(record, cfg, 'BNB', 'USDT')
+            except Exception as e:
+                continue
+            fast_gain = eval_grid(record, cfg, trade_fee)
+            max_diff = max(max_diff, abs(gain - fast_gain))
+            print('%s replay: %.8f eval: %.8f' % ([cfg[k] for k in grid.keys()], gain, fast_gain))
+        print('max diff: %s' % max_diff)
+
+        screen = list(expand_grid(config, {'grid_num': range(20, 80), 'sell_greedy_x': [1.0 + i * 0.001 for i in range(10)]}))
+        st = time.time()
+        for cfg in screen:
+            eval_grid(record, cfg, trade_fee)
+        el = time.time() - st
+        print('ticks: %s configs: %s cost: %.2fs configs/s: %.0f' % (tick_num, len(screen), el, len(screen) / el))
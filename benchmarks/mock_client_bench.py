@@ -0,0 +1,41 @@
+#! /usr/bin/python3
+import os
+import sys
+import math
+import time
+import random
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')))
+from strategy.mock_client import MockClient
+
+def gen_record(file_name, tick_num, price = 250., seed = 1):
+    rnd = random.Random(seed)
+    with open(file_name, 'w') as fh:
+        t = time.time()
+        for i in range(tick_num):
+            price = min(max(price * (1. + rnd.gauss(0, 0.0015)), 150.), 400.)
+            fh.write('%s %s %s\n' % (t + i, round(price * 1.0002, 2), round(price * 0.9998, 2)))
+
+def bench(record_file, tick_num, order_num):
+    client = MockClient(record_file, 'BNB', 'USDT', max_line = tick_num)
+    pper = math.pow(400. / 150., 1.0 / order_num)
+    for i in range(order_num):
+        fp = round(150. * math.pow(pper, i), 2)
+        side = 'BUY' if fp < 250. else 'SELL'
+        client.create_limit_order('BNBUSDT', side, 1.0, fp, 'b_%s' % i)
+    st = time.time()
+    n = 0
+    while client.has_next():
+        client.next()
+        n += 1
+    el = time.time() - st
+    return n, el
+
+if __name__ == '__main__':
+    tick_num = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    order_num = int(sys.argv[2]) if len(sys.argv) > 2 else 110
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        record_file = os.path.join(tmp_dir, 'bench.record')
+        gen_record(record_file, tick_num)
+        n, el = bench(record_file, tick_num, order_num)
+        print('ticks: %s orders: %s cost: %.2fs ticks/s: %.0f' % (n, order_num, el, n / el))
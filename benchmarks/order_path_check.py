@@ -0,0 +1,90 @@
+#! /usr/bin/python3
+import os
+import sys
+import tempfile
+import logging as logger
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')))
+from strategy.tick_record import TickRecord
+from strategy.mock_client import MockClient
+from strategy.grid_v1 import GridRun
+from mock_client_bench import gen_record
+from grid_eval_check import config
+
+# MockClient of a flaky exchange, the fail_batch-th batch is placed but its
+# call raises, the first fail_query open orders queries after a batch fail
+class FlakyClient(MockClient):
+    def __init__(self, *args, fail_batch = 0, fail_query = 0, **kwargs):
+        MockClient.__init__(self, *args, **kwargs)
+        self.fail_batch = fail_batch
+        self.fail_query = fail_query
+        self.batches = 0
+
+    def create_batch_limit_orders(self, symbol, orders):
+        ret = MockClient.create_batch_limit_orders(self, symbol, orders)
+        self.batches += 1
+        if self.batches == self.fail_batch:
+            raise Exception('batch response lost')
+        return ret
+
+    def get_all_open_orders(self, symbol):
+        if self.batches > 0 and self.fail_query > 0:
+            self.fail_query -= 1
+            raise Exception('open orders query failed')
+        return MockClient.get_all_open_orders(self, symbol)
+
+# GridRun whose state saves of the given numbers fail, after the orders are sent
+class FlakyRun(GridRun):
+    def __init__(self, *args, fail_save = (), **kwargs):
+        self.fail_save = fail_save
+        self.saves = 0
+        GridRun.__init__(self, *args, **kwargs)
+
+    def save_local_cache(self, content):
+        self.saves += 1
+        if self.saves in self.fail_save:
+            raise Exception('state save failed')
+        GridRun.save_local_cache(self, content)
+
+def run(client, fail_save):
+    runner = FlakyRun(client = client, config = dict(config), verbose = False, fail_save = fail_save)
+    runner.order_sleep = 0.
+    while client.has_next():
+        runner.work_loop()
+        client.next_event()
+    return runner
+
+if __name__ == '__main__':
+    tick_num = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    logger.disable(logger.CRITICAL)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        record_file = os.path.join(tmp_dir, 'check.record')
+        gen_record(record_file, tick_num)
+        record = TickRecord(record_file, max_line = None)
+        cases = [
+            ('one by one', {}),
+            ('batch', {'batch_order_size': 5}),
+            ('batch raises after placing', {'batch_order_size': 5, 'fail_batch': 3}),
+            ('open orders query fails after batch', {'batch_order_size': 5, 'fail_query': 1}),
+            ('open orders query fails after orders', {'fail_query': 1}),
+            ('state save fails after orders', {'fail_save': (1, 20)}),
+        ]
+        base = None
+        failed = 0
+        for name, kwargs in cases:
+            kwargs = dict(kwargs)
+            fail_save = kwargs.pop('fail_save', ())
+            client = FlakyClient(record, 'BNB', 'USDT', **kwargs)
+            # placed by hand on the same key, never cancelled by the strategy
+            client.create_limit_order('BNBUSDT', 'BUY', 1.0, 100., 'manual_1')
+            runner = run(client, fail_save)
+            gain = runner.get_total_gain()
+            local = len(runner.last_open_orders)
+            remote = len(client.get_orders(client, 'BNBUSDT', runner.strategy_id))
+            GridRun(client = client, config = dict(config, run_target = 'quit'), verbose = False)
+            left = list(client.open_orders.keys())
+            if base is None:
+                base = gain
+            ok = gain == base and local == remote == config['grid_num'] and left == ['manual_1']
+            failed += not ok
+            print('%-40s gain: %.8f local: %s remote: %s left: %s %s' % (name, gain, local, remote, left, 'ok' if ok else 'FAIL'))
+        sys.exit(1 if failed else 0)
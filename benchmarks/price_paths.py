@@ -0,0 +1,57 @@
+#! /usr/bin/python3
+import os
+import sys
+import math
+import time
+import numpy as np
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')))
+from strategy.tick_record import write_binary_record
+
+# synthetic mid prices, all kept inside [low, up] so every grid config of
+# the benchmarks sees the whole path
+
+def random_walk(tick_num, rnd, price = 250., sigma = 0.0015):
+    return price * np.exp(np.cumsum(rnd.normal(0, sigma, tick_num)))
+
+def trending(tick_num, rnd, price = 160., sigma = 0.0015):
+    # drifts up about 2x over the path
+    drift = math.log(2.) / tick_num
+    return price * np.exp(np.cumsum(rnd.normal(drift, sigma, tick_num)))
+
+def mean_reverting(tick_num, rnd, price = 250., sigma = 0.0015, theta = 0.01):
+    noise = rnd.normal(0, sigma, tick_num)
+    prices = np.empty(tick_num)
+    lp = mu = math.log(price)
+    for i in range(tick_num):
+        lp += theta * (mu - lp) + noise[i]
+        prices[i] = lp
+    return np.exp(prices)
+
+def flash_crash(tick_num, rnd, price = 300., sigma = 0.001, depth = 0.4):
+    # random walk, in the middle it loses depth within 1% of the ticks and
+    # recovers within the next 5%
+    prices = random_walk(tick_num, rnd, price, sigma)
+    st = tick_num // 2
+    down = max(tick_num // 100, 1)
+    up = max(tick_num // 20, 1)
+    shock = np.ones(tick_num)
+    shock[st:st + down] = np.linspace(1., 1. - depth, down)
+    shock[st + down:st + down + up] = np.linspace(1. - depth, 1., up)
+    return prices * shock
+
+PATHS = {
+    'random_walk': random_walk,
+    'trending': trending,
+    'mean_reverting': mean_reverting,
+    'flash_crash': flash_crash,
+}
+
+def gen_path(path, tick_num, seed = 1, low = 151., up = 399.):
+    rnd = np.random.default_rng(seed)
+    return np.clip(PATHS[path](tick_num, rnd), low, up)
+
+def write_path_record(record_file, path, tick_num, seed = 1, symbol = 'BNBUSDT'):
+    mid = gen_path(path, tick_num, seed)
+    times = time.time() + np.arange(tick_num, dtype = np.float64)
+    write_binary_record(record_file, symbol, times, np.round(mid * 1.0002, 2), np.round(mid * 0.9998, 2))
+    return record_file
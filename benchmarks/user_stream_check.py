@@ -0,0 +1,145 @@
+#! /usr/bin/python3
+import os
+import sys
+import tempfile
+import logging as logger
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')))
+from strategy.tick_record import TickRecord
+from strategy.mock_client import MockClient
+from strategy.spot_client import BNClient
+from strategy.future_client import BNFClient
+from strategy.grid_v1 import GridRun
+from strategy.user_stream import parse_spot_event, parse_future_event
+from run import attach_user_stream
+from mock_client_bench import gen_record
+from grid_eval_check import config
+
+SPOT_FILLED = {'e': 'executionReport', 'E': 1700000000100, 's': 'BNBUSDT', 'c': 'a_3_0_1234_4700000_BUY',
+               'S': 'BUY', 'o': 'LIMIT', 'f': 'GTC', 'q': '0.12340000', 'p': '250.00000000',
+               'C': '', 'x': 'TRADE', 'X': 'FILLED', 'z': '0.12340000', 'T': 1700000000099}
+SPOT_CANCELED = {'e': 'executionReport', 'E': 1700000000200, 's': 'BNBUSDT', 'c': 'web_5f3a',
+                 'S': 'SELL', 'o': 'LIMIT', 'f': 'GTC', 'q': '0.12340000', 'p': '260.00000000',
+                 'C': 'b_4_0_1234_4700001_SELL', 'x': 'CANCELED', 'X': 'CANCELED', 'z': '0.00000000',
+                 'T': 1700000000199}
+SPOT_ACCOUNT = {'e': 'outboundAccountPosition', 'E': 1700000000300, 'B': []}
+FUTURE_FILLED = {'e': 'ORDER_TRADE_UPDATE', 'E': 1700000000400, 'T': 1700000000398,
+                 'o': {'s': 'BNBUSDT', 'c': 'a_7_0_5_4700002_SELL', 'S': 'SELL', 'o': 'LIMIT', 'f': 'GTC',
+                       'q': '0.05', 'p': '270.00', 'x': 'TRADE', 'X': 'FILLED', 'z': '0.05', 'T': 1700000000399}}
+FUTURE_ACCOUNT = {'e': 'ACCOUNT_UPDATE', 'E': 1700000000500, 'T': 1700000000499, 'a': {}}
+STREAM_ERROR = {'e': 'error', 'm': 'Max reconnect retries reached'}
+
+PARSE_CASES = [
+    ('spot filled', parse_spot_event, SPOT_FILLED,
+     {'symbol': 'BNBUSDT', 'clientOrderId': 'a_3_0_1234_4700000_BUY', 'side': 'BUY', 'status': 'FILLED',
+      'origQty': '0.12340000', 'executedQty': '0.12340000', 'price': '250.00000000', 'time': 1700000000099}),
+    ('spot canceled by original id', parse_spot_event, SPOT_CANCELED,
+     {'symbol': 'BNBUSDT', 'clientOrderId': 'b_4_0_1234_4700001_SELL', 'side': 'SELL', 'status': 'CANCELED',
+      'origQty': '0.12340000', 'executedQty': '0.00000000', 'price': '260.00000000', 'time': 1700000000199}),
+    ('spot account', parse_spot_event, SPOT_ACCOUNT, None),
+    ('future filled', parse_future_event, FUTURE_FILLED,
+     {'symbol': 'BNBUSDT', 'clientOrderId': 'a_7_0_5_4700002_SELL', 'side': 'SELL', 'status': 'FILLED',
+      'origQty': '0.05', 'executedQty': '0.05', 'price': '270.00', 'time': 1700000000399}),
+    ('future account', parse_future_event, FUTURE_ACCOUNT, None),
+]
+
+# ThreadedWebsocketManager that keeps the callbacks instead of connecting
+class LoopbackTwm:
+    def __init__(self):
+        self.spot = []
+        self.future = []
+
+    def start_user_socket(self, callback):
+        self.spot.append(callback)
+
+    def start_futures_user_socket(self, callback):
+        self.future.append(callback)
+
+class CountNotify:
+    def __init__(self):
+        self.n = 0
+
+    def set(self):
+        self.n += 1
+
+def drain(q):
+    ret = []
+    while not q.empty():
+        ret.append(q.get_nowait()['clientOrderId'])
+    return ret
+
+def check_shared_stream():
+    # two spot strategies and a futures one on one key, one socket of each type
+    twm = LoopbackTwm()
+    notify = CountNotify()
+    order_hubs = {}
+    spot_a, spot_b, future_a = BNClient(None), BNClient(None), BNFClient(None)
+    attach_user_stream(spot_a, 'spot', 'key', twm, notify, order_hubs)
+    attach_user_stream(spot_b, 'spot', 'key', twm, notify, order_hubs)
+    attach_user_stream(future_a, 'future', 'key', twm, notify, order_hubs)
+    qa = spot_a.subscribe_order_events('a_')
+    qb = spot_b.subscribe_order_events('b_')
+    qf = future_a.subscribe_order_events('a_')
+    for msg in (SPOT_FILLED, SPOT_CANCELED, SPOT_ACCOUNT, STREAM_ERROR):
+        twm.spot[0](msg)
+    for msg in (FUTURE_FILLED, FUTURE_ACCOUNT, STREAM_ERROR):
+        twm.future[0](msg)
+    got = (len(twm.spot), len(twm.future), drain(qa), drain(qb), drain(qf), notify.n)
+    want = (1, 1, ['a_3_0_1234_4700000_BUY'], ['b_4_0_1234_4700001_SELL'], ['a_7_0_5_4700002_SELL'], 3)
+    return got == want, got
+
+# MockClient counting the open orders queries made outside order placement
+class CountClient(MockClient):
+    def __init__(self, *args, **kwargs):
+        MockClient.__init__(self, *args, **kwargs)
+        self.placing = False
+        self.polls = 0
+
+    def get_all_open_orders(self, symbol):
+        if not self.placing:
+            self.polls += 1
+        return MockClient.get_all_open_orders(self, symbol)
+
+class CountRun(GridRun):
+    def create_orders(self, reqs):
+        self.client.placing = True
+        try:
+            return GridRun.create_orders(self, reqs)
+        finally:
+            self.client.placing = False
+
+def run(record, fill_mode):
+    client = CountClient(record, 'BNB', 'USDT')
+    runner = CountRun(client = client, config = dict(config, fill_mode = fill_mode, stream_check_interval = 1e9),
+                      verbose = False)
+    runner.order_sleep = 0.
+    # the start up fetches the open orders, placed by init_order or not
+    runner.work_loop()
+    client.polls = 0
+    client.next_event()
+    while client.has_next():
+        runner.work_loop()
+        client.next_event()
+    return runner.get_total_gain(), client.polls
+
+if __name__ == '__main__':
+    tick_num = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    logger.disable(logger.CRITICAL)
+    failed = 0
+    for name, parser, msg, want in PARSE_CASES:
+        got = parser(msg)
+        failed += got != want
+        print('%-40s %s' % (name, 'ok' if got == want else 'FAIL %s' % got))
+    ok, got = check_shared_stream()
+    failed += not ok
+    print('%-40s %s' % ('one stream per key', 'ok' if ok else 'FAIL %s' % (got, )))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        record_file = os.path.join(tmp_dir, 'check.record')
+        gen_record(record_file, tick_num)
+        record = TickRecord(record_file, max_line = None)
+        poll_gain, poll_polls = run(record, 'poll')
+        stream_gain, stream_polls = run(record, 'stream')
+        ok = stream_gain == poll_gain and stream_polls == 0
+        failed += not ok
+        print('%-40s poll gain: %.8f polls: %s stream gain: %.8f polls: %s %s' % (
+              'stream vs poll', poll_gain, poll_polls, stream_gain, stream_polls, 'ok' if ok else 'FAIL'))
+    sys.exit(1 if failed else 0)
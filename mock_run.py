@@ -11,6 +11,10 @@ from strategy.spot_client import BNClient
 from strategy.mock_client import MockClient
 import json
 import signal
+import argparse
+from strategy.sweep import run_sweep, save_results
+from strategy.profiler import SamplingProfiler
+from strategy.result_cache import ResultCache
 
 def signal_handler(sig_num, frame):
     logger.info("receive signal %s set is_stop True", sig_num)
@@ -45,27 +49,51 @@ if __name__ == '__main__':
         "cache_type" : "mem"
     }
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--record', default = 'bnb.record')
+    parser.add_argument('--target_symbol', default = 'BNB')
+    parser.add_argument('--base_symbol', default = 'USDT')
+    parser.add_argument('--max_line', type = int, default = 100000, help = '0 for the whole record')
+    parser.add_argument('--processes', type = int, default = None)
+    parser.add_argument('--fast', action = 'store_true', help = 'pre-screen by the vectorized grid evaluator')
+    parser.add_argument('--output', default = None, help = 'save ranked result to .csv or .json')
+    parser.add_argument('--multiplex', type = int, default = 0,
+                        help = 'backtest this many configs together on one pass of the record')
+    parser.add_argument('--result_cache', default = 'sweep_cache.db',
+                        help = 'sqlite file of the evaluated configs, empty to evaluate all again')
+    parser.add_argument('--cache_size', type = int, default = 256, help = 'MB of the result cache')
+    parser.add_argument('--checkpoint_dir', default = 'checkpoint',
+                        help = 'resume the backtests from their checkpoints, empty to replay from the first tick')
+    parser.add_argument('--keep_checkpoints', action = 'store_true',
+                        help = 'keep the checkpoints of finished configs, a sweep over the grown record resumes them')
+    parser.add_argument('--profile', default = None,
+                        help = 'sample the sweep in this process, save to PROFILE.folded and PROFILE.top.txt')
+    args = parser.parse_args()
+
     init_logger('mock.log', level = logger.INFO)
     hi = [i for i in range(20, 80)]
     hs = [1.003]
-    bl = config['up_bound'] / config['low_bound']
-    ar = []
-    mx, mi, ms = 0., -1, -1
-    for i in hi:
-        dg = math.pow(bl, 1.0 / i)
-        for si in hs:
-            config['grid_num'] = i
-            config['sell_greedy_x'] = si
-            mock_client = MockClient('bnb.record', 'BNB', 'USDT')
-            runner = create_strategy(mock_client, config)
-            runner.order_sleep = 0.
-            while mock_client.has_next():
-                runner.work_loop()
-                mock_client.next()
-            gain = runner.get_total_gain()
-            ar.append([gain, i, config['sell_greedy_x']])
-            logger.info('g:%s, gx:%s, gain:%s', i, config['sell_greedy_x'], runner.get_total_gain())
-    sar = sorted(ar, key = lambda x: -x[0])
+    grid = {
+        'grid_num': hi,
+        'sell_greedy_x': hs,
+    }
+    profiler = None
+    if args.profile:
+        profiler = SamplingProfiler(cpu_timer = True)
+        profiler.start()
+    result_cache = None
+    if args.result_cache and profiler is None:
+        result_cache = ResultCache(args.result_cache, args.cache_size << 20)
+    sar = run_sweep(args.record, args.target_symbol, args.base_symbol, config, grid,
+                    processes = args.processes, max_line = args.max_line, fast = args.fast, profiler = profiler,
+                    multiplex = args.multiplex, result_cache = result_cache,
+                    checkpoint_dir = args.checkpoint_dir, keep_checkpoints = args.keep_checkpoints)
+    if result_cache is not None:
+        result_cache.close()
+    if profiler is not None:
+        profiler.stop()
+        profiler.save(args.profile)
+    if args.output:
+        save_results(sar, args.output)
     for i in range(min(20, len(sar))):
         logger.info(sar[i])
-
@@ -7,46 +7,36 @@ import math
 import time
 import logging as logger
 from strategy.logger import init_logger
-from strategy.grid_v1 import GridRun
-from strategy.spot_client import BNClient
+from strategy.tick_recorder import TickRecorder, FakeTickStream
 import json
 import signal
+import argparse
 
 def signal_handler(sig_num, frame):
     logger.info("receive signal %s set is_stop True", sig_num)
     global is_stop
     is_stop = True
 
-def create_client(client_type, api_key, api_secret):
-    if client_type == "spot":
-        return BNClient(Client(api_key, api_secret))
-    else:
-        logger.error("unsupport client type")
-        return None
-
-def create_strategy(client, config):
-    if config['strategy_type'] == "grid_v1":
-        return GridRun(client = client, config = config)
-    else:
-        logger.error("unsupport strategy type")
-        return None
-
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        print('usage: %s config_file' % sys.argv[0])
-        sys.exit(1)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config_file')
+    parser.add_argument('--fake_rate', type = float, default = 0.,
+                        help = 'record a local fake stream of this many ticks per symbol per second')
+    parser.add_argument('--duration', type = float, default = 0., help = 'stop after seconds, 0 runs until signal')
+    args = parser.parse_args()
 
     config = None
-    with open(sys.argv[1], 'r') as fh:
+    with open(args.config_file, 'r') as fh:
         content = ''.join(fh.readlines())
         config = json.loads(content)
-    
-    api_key = config['api_key']
-    api_secret = config['api_secret']
 
     init_logger('record.log', level = logger.INFO)
 
-    client = create_client('spot', api_key, api_secret)
+    record_config = config.get('record', {})
+    symbols = record_config.get('symbols')
+    if not symbols:
+        # the pairs of the strategies
+        symbols = sorted(set([cfg['target_symbol'] + cfg['base_symbol'] for cfg in config['strategy']]))
 
     global is_stop
     is_stop = False
@@ -57,29 +47,15 @@ if __name__ == '__main__':
     signal.signal(signal.SIGUSR2, signal_handler)    
 
     st = time.time()
-    coin_pair = ['ATAUSDT', 'BNBUSDT', 'ADAUSDT']
-    fh = {
-        'ATAUSDT': open('ata.record', 'a+'),
-        'BNBUSDT': open('bnb.record', 'a+'),
-        'ADAUSDT': open('ada.record', 'a+'),
-    }
-    last_buy = {}
-    last_sell = {}
-    while not is_stop:
-        for cp in coin_pair:
-            try:
-                s = client.get_cur_sell(symbol=cp)
-                b = client.get_cur_buy(symbol=cp)
-                if s and b:
-                    if cp not in last_buy:
-                        last_buy[cp] = -1.0
-                        last_sell[cp] = -1.0
-                    if str(s[0]) != str(last_sell[cp]) or str(b[0]) != str(last_buy[cp]):
-                        fh[cp].write('%s %s %s\n' % (time.time(), s[0], b[0]))
-                        last_buy[cp], last_sell[cp] = b[0], s[0]
-                
-            except Exception as e:
-                logger.error(e)
-        time.sleep(1)
-    for p in fh.values():
-        p.close()
+    if args.fake_rate > 0:
+        twm = FakeTickStream(rate = args.fake_rate)
+    else:
+        twm = ThreadedWebsocketManager(api_key = config['api_key'], api_secret = config['api_secret'])
+    twm.start()
+    recorder = TickRecorder(record_config.get('out_dir', 'record'), rotate = record_config.get('rotate', 'hour'),
+                            flush_interval = record_config.get('flush_interval', 5.))
+    recorder.start(twm, symbols, futures = record_config.get('futures', False))
+    logger.info('record %s symbols to %s', len(symbols), recorder.out_dir)
+    recorder.run(lambda: is_stop or (args.duration > 0 and time.time() - st >= args.duration))
+    twm.stop()
+    logger.info('recorded %s ticks in %.1fs', recorder.ticks, time.time() - st)
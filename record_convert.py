@@ -0,0 +1,25 @@
+#! /usr/bin/python3
+import os
+import sys
+import time
+import logging as logger
+from strategy.logger import init_logger
+from strategy.tick_record import convert_text_record
+from strategy.tick_recorder import CHUNK_MAGIC, convert_chunk_record
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4:
+        print('usage: %s text_record_file|tick_chunk_file|tick_chunk_dir binary_record_file symbol' % sys.argv[0])
+        sys.exit(1)
+
+    init_logger('convert.log', level = logger.INFO)
+    st = time.time()
+    is_chunk = os.path.isdir(sys.argv[1])
+    if not is_chunk:
+        with open(sys.argv[1], 'rb') as fh:
+            is_chunk = fh.read(len(CHUNK_MAGIC)) == CHUNK_MAGIC
+    if is_chunk:
+        rows = convert_chunk_record(sys.argv[1], sys.argv[2], sys.argv[3])
+    else:
+        rows = convert_text_record(sys.argv[1], sys.argv[2], sys.argv[3])
+    logger.info('convert %s rows of %s to %s cost %.2fs', rows, sys.argv[1], sys.argv[2], time.time() - st)
@@ -9,37 +9,151 @@ from strategy.logger import init_logger
 from strategy.grid_v1 import GridRun
 from strategy.spot_client import BNClient
 from strategy.future_client import BNFClient
+from strategy.quote_cache import QuoteCache
+from strategy.rate_limiter import RateLimiter
+from strategy.order_snapshot import OpenOrderSnapshot
+from strategy.user_stream import OrderEventHub
+from strategy.metrics import registry, start_metrics_server
+from strategy.profiler import SamplingProfiler
 import json
 import signal
+import requests
+import asyncio
+import argparse
+import concurrent.futures
 
 def signal_handler(sig_num, frame):
     logger.info("receive signal %s set is_stop True", sig_num)
     global is_stop
     is_stop = True
 
-def create_client(client_type, api_key, api_secret):
+def create_session_client(api_key, api_secret, pool_size):
+    # one http session per api key and client type, its keep-alive pool
+    # holds a connection for every strategy that may request concurrently
+    client = Client(api_key, api_secret)
+    adapter = requests.adapters.HTTPAdapter(pool_connections = 4, pool_maxsize = max(pool_size, 10))
+    client.session.mount('https://', adapter)
+    return client
+
+def create_client(client_type, api_key, api_secret, session_clients, pool_size = 10):
+    key = (api_key, client_type)
+    if client_type in ("spot", "future") and key not in session_clients:
+        session_clients[key] = create_session_client(api_key, api_secret, pool_size)
     if client_type == "spot":
-        return BNClient(Client(api_key, api_secret))
+        return BNClient(session_clients[key])
     if client_type == "future":
-        return BNFClient(Client(api_key, api_secret))
+        return BNFClient(session_clients[key])
     else:
         logger.error("unsupport client type")
         return None
 
-def create_strategy(client, config):
+def attach_user_stream(client, client_type, api_key, twm, notify, order_hubs):
+    # one user data socket and hub per api key and client type, every
+    # strategy on it subscribes to the hub by its order id prefix
+    key = (api_key, client_type)
+    if key not in order_hubs:
+        order_hubs[key] = OrderEventHub(notify)
+        client.start_user_stream(twm, order_hubs[key])
+    client.set_order_events(order_hubs[key])
+
+class AsyncNotify:
+    # set from the websocket threads, wakes every strategy task
+    def __init__(self):
+        self.loop = None
+        self.events = []
+
+    def bind(self, loop):
+        self.loop = loop
+
+    def new_event(self):
+        ev = asyncio.Event()
+        self.events.append(ev)
+        return ev
+
+    def set(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.wake)
+
+    def wake(self):
+        for ev in self.events:
+            ev.set()
+
+async def run_strategy(runner, wake):
+    # each strategy advances on its own, the blocking exchange calls of
+    # work_loop run in the thread pool
+    while not is_stop and runner.run_target != 'quit':
+        try:
+            await asyncio.to_thread(runner.work_loop)
+        except Exception as e:
+            logger.exception(e)
+        try:
+            await asyncio.wait_for(wake.wait(), 1)
+        except asyncio.TimeoutError:
+            pass
+        wake.clear()
+
+async def report_gain(runners, gain_map):
+    st = time.time()
+    while not is_stop:
+        await asyncio.sleep(1)
+        if time.time() - st <= 10:
+            continue
+        st = time.time()
+        group_gain = {}
+        changed = False
+        for runner in runners:
+            if runner.run_target == 'quit':
+                continue
+            if runner.strategy_id not in gain_map:
+                gain_map[runner.strategy_id] = runner.get_total_gain()
+                changed = True
+            else:
+                if runner.get_total_gain() > gain_map[runner.strategy_id]:
+                    gain_map[runner.strategy_id] = runner.get_total_gain()
+                    changed = True
+            group_gain[runner.group] = group_gain.get(runner.group, 0) + runner.get_total_gain()
+        if changed:
+            logger.info("gain %s", gain_map)
+            logger.info("group_income %s", group_gain)
+
+async def report_metrics(interval):
+    st = time.time()
+    while not is_stop:
+        await asyncio.sleep(1)
+        if time.time() - st <= interval:
+            continue
+        st = time.time()
+        logger.info("metrics %s", registry.summary())
+
+async def serve(runners, notify, gain_map, metrics_interval = 60):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(max_workers = len(runners)))
+    notify.bind(loop)
+    tasks = [run_strategy(runner, notify.new_event()) for runner in runners]
+    await asyncio.gather(report_gain(runners, gain_map), report_metrics(metrics_interval), *tasks)
+
+# request weight per minute of one api key
+WEIGHT_LIMIT = {
+    'spot': 6000,
+    'future': 2400,
+}
+
+def create_strategy(client, config, order_snapshot = None, profiler = None):
     if config['strategy_type'] == "grid_v1":
-        return GridRun(client = client, config = config)
+        return GridRun(client = client, config = config, order_snapshot = order_snapshot, profiler = profiler)
     else:
         logger.error("unsupport strategy type")
         return None
 
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        print('usage: %s config_file' % sys.argv[0])
-        sys.exit(1)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config_file')
+    parser.add_argument('--profile', default = None,
+                        help = 'sample the strategy threads, save to PROFILE.folded and PROFILE.top.txt on exit')
+    args = parser.parse_args()
 
     config = None
-    with open(sys.argv[1], 'r') as fh:
+    with open(args.config_file, 'r') as fh:
         content = ''.join(fh.readlines())
         config = json.loads(content)
     
@@ -48,12 +162,47 @@ if __name__ == '__main__':
 
     init_logger('run.log', level = logger.INFO)
 
+    twm = None
+    notify = AsyncNotify()
+    quote_caches = {}
+    if config.get('quote_stream', False):
+        # one book ticker subscription per symbol shared by all strategies
+        twm = ThreadedWebsocketManager(api_key = api_key, api_secret = api_secret)
+        twm.start()
+        for cfg in config['strategy']:
+            if cfg['client_type'] not in quote_caches:
+                quote_caches[cfg['client_type']] = QuoteCache()
+            quote_caches[cfg['client_type']].start(
+                twm, [cfg['target_symbol'] + cfg['base_symbol']], futures = cfg['client_type'] == 'future')
+    profiler = None
+    if args.profile:
+        profiler = SamplingProfiler()
+        profiler.start()
+    rate_limiters = {}
+    # strategies on one symbol share a single open orders fetch per cycle
+    order_snapshots = {}
+    session_clients = {}
+    order_hubs = {}
     runners = []
     for cfg in config['strategy']:
-        client = create_client(cfg['client_type'], api_key, api_secret)
+        pool_size = len([c for c in config['strategy'] if c['client_type'] == cfg['client_type']])
+        client = create_client(cfg['client_type'], api_key, api_secret, session_clients, pool_size)
         if not client:
             continue
-        strategy = create_strategy(client, cfg)
+        if cfg['client_type'] not in rate_limiters:
+            rate_limiters[cfg['client_type']] = RateLimiter(
+                config.get('weight_limit', {}).get(cfg['client_type'], WEIGHT_LIMIT[cfg['client_type']]))
+        client.set_rate_limiter(rate_limiters[cfg['client_type']])
+        if cfg['client_type'] in quote_caches:
+            client.set_quote_cache(quote_caches[cfg['client_type']])
+        if cfg.get('fill_mode', 'poll') == 'stream' and cfg.get('run_target', 'join') != 'quit':
+            if twm is None:
+                twm = ThreadedWebsocketManager(api_key = api_key, api_secret = api_secret)
+                twm.start()
+            attach_user_stream(client, cfg['client_type'], api_key, twm, notify, order_hubs)
+        if cfg['client_type'] not in order_snapshots:
+            order_snapshots[cfg['client_type']] = OpenOrderSnapshot()
+        strategy = create_strategy(client, cfg, order_snapshots[cfg['client_type']], profiler)
         if not strategy:
             continue
         runners.append(strategy)
@@ -68,35 +217,16 @@ if __name__ == '__main__':
     signal.signal(signal.SIGUSR1, signal_handler)
     signal.signal(signal.SIGUSR2, signal_handler)    
 
-    st = time.time()
+    if config.get('metrics_port'):
+        start_metrics_server(config['metrics_port'])
+
     gain_map = {}
-    while not is_stop:
-        new_runners = []        
-        for runner in runners:
-            try:
-                runner.work_loop()
-            except Exception as e:
-                logger.exception(e)
-            if runner.run_target != 'quit':
-                new_runners.append(runner)
-        runners = new_runners
-        if time.time() - st > 10:
-            group_gain = {}
-            changed = False
-            for runner in runners:
-                if runner.strategy_id not in gain_map:
-                    gain_map[runner.strategy_id] = runner.get_total_gain()
-                    changed = True
-                else:
-                    if runner.get_total_gain() > gain_map[runner.strategy_id]:
-                        gain_map[runner.strategy_id] = runner.get_total_gain()
-                        changed = True
-                group_gain[runner.group] = group_gain.get(runner.group, 0) + runner.get_total_gain()
-            if changed:
-                logger.info("gain %s", gain_map)
-                logger.info("group_income %s", group_gain)
-            st = time.time()
-        time.sleep(1)
+    asyncio.run(serve(runners, notify, gain_map, config.get('metrics_interval', 60)))
+    if twm is not None:
+        twm.stop()
+    if profiler is not None:
+        profiler.stop()
+        profiler.save(args.profile)
     logger.info("gain %s", gain_map)    
     logger.info("i'm exitted")    
 
@@ -0,0 +1,26 @@
+#! /usr/bin/python3
+import os
+import sys
+import argparse
+from strategy.sqlite_cache import get_store, default_db_file
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db_file', default = None, help = 'default data/state.db')
+    parser.add_argument('--group', default = None, help = 'only the strategies of this group')
+    args = parser.parse_args()
+
+    db_file = args.db_file or default_db_file()
+    if not os.path.exists(db_file):
+        print('no state db %s' % db_file)
+        sys.exit(1)
+    store = get_store(db_file)
+    print('%-24s %-12s %-12s %14s %6s %6s' % ('strategy_id', 'group', 'symbol', 'gain', 'buy', 'sell'))
+    for strategy_id, group, symbol, gain, buys, sells in store.strategy_summary():
+        if args.group is not None and group != args.group:
+            continue
+        print('%-24s %-12s %-12s %14.6f %6d %6d' % (strategy_id, group, symbol, gain or 0., buys, sells))
+    group_gains = store.group_gains()
+    if args.group is not None:
+        group_gains = dict((k, v) for k, v in group_gains.items() if k == args.group)
+    print('group_income %s' % group_gains)
@@ -0,0 +1,100 @@
+#! /usr/bin/python3
+import os
+import time
+import pickle
+import hashlib
+import logging as logger
+from strategy.result_cache import engine_version, normalize_config
+
+def checkpoint_file(checkpoint_dir, configs, target_symbol, base_symbol):
+    # named by the configs, not the record, a longer record of the same
+    # market finds the checkpoint of its prefix
+    key = '%s:%s%s:%s' % (engine_version(), target_symbol, base_symbol,
+                          '|'.join(normalize_config(config) for config in configs))
+    return os.path.join(checkpoint_dir, hashlib.sha256(key.encode()).hexdigest()[:24] + '.ckpt')
+
+# digest of the record prefixes. The sha256 of every block of ticks is made
+# once, the digest of the first n ticks is the sha256 of the block digests
+# before n and of the ticks after the last whole block, so it costs at most
+# one block whatever n is
+class RecordDigest:
+    def __init__(self, record, block_size = 65536):
+        self.record = record
+        self.block_size = block_size
+        self.blocks = [self.hash_range(i, i + block_size)
+                       for i in range(0, len(record) - block_size + 1, block_size)]
+
+    def hash_range(self, st, ed):
+        md = hashlib.sha256()
+        for col in (self.record.times, self.record.asks, self.record.bids):
+            md.update(col[st:ed].tobytes())
+        return md.digest()
+
+    def prefix(self, n):
+        k = n // self.block_size
+        md = hashlib.sha256(b''.join(self.blocks[:k]))
+        md.update(self.hash_range(k * self.block_size, n))
+        return md.hexdigest()
+
+# the whole simulation of a backtest, MockClient with its books, balances
+# and cur_index and the GridRuns on it, pickled between two events. The
+# checkpoint also keeps the digest of the ticks it has passed, it is only
+# resumed on a record starting with the same ticks
+class Checkpoint:
+    def __init__(self, file_name, record_digest, interval = 60.):
+        self.file_name = file_name
+        self.record_digest = record_digest
+        self.interval = interval
+        self.engine = engine_version()
+        self.last_save = time.time()
+
+    def load(self):
+        # (mock_client, runners) to resume, None to start from the first tick
+        if not os.path.exists(self.file_name):
+            return None
+        try:
+            with open(self.file_name, 'rb') as fh:
+                ckpt = pickle.load(fh)
+        except Exception as e:
+            logger.error('bad checkpoint %s: %s', self.file_name, e)
+            return None
+        if ckpt['engine'] != self.engine:
+            logger.info('checkpoint %s of an old engine', self.file_name)
+            return None
+        record = self.record_digest.record
+        if ckpt['ticks'] > len(record) or self.record_digest.prefix(ckpt['ticks']) != ckpt['digest']:
+            logger.info('checkpoint %s is not a prefix of the record', self.file_name)
+            return None
+        mock_client = ckpt['mock_client']
+        mock_client.record = record
+        logger.info('resume %s from tick %s', self.file_name, mock_client.cur_index)
+        return mock_client, ckpt['runners']
+
+    def save(self, mock_client, runners, force = False):
+        if not force and time.time() - self.last_save < self.interval:
+            return False
+        n = mock_client.cur_index + 1
+        ckpt = {
+            'engine': self.engine,
+            'ticks': n,
+            'digest': self.record_digest.prefix(n),
+            'mock_client': mock_client,
+            'runners': runners,
+        }
+        checkpoint_dir = os.path.dirname(self.file_name)
+        if checkpoint_dir and not os.path.exists(checkpoint_dir):
+            os.makedirs(checkpoint_dir, exist_ok = True)
+        tmp_file = self.file_name + '.tmp'
+        with open(tmp_file, 'wb') as fh:
+            pickle.dump(ckpt, fh, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, self.file_name)
+        self.last_save = time.time()
+        return True
+
+    def finish(self, mock_client, runners, keep = True):
+        # a finished backtest is kept to resume on a longer record, else
+        # its result is in the result cache and the checkpoint goes
+        if keep:
+            self.save(mock_client, runners, force = True)
+        elif os.path.exists(self.file_name):
+            os.remove(self.file_name)
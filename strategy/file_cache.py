@@ -29,6 +29,11 @@ class FileCache:
         return {}
 
     def save_local_cache(self, content):
-        with open(self.cache_file_name, 'w') as fh:
+        # write to temp then rename, a crash never leaves a half written file
+        tmp_file_name = self.cache_file_name + '.tmp'
+        with open(tmp_file_name, 'w') as fh:
             fh.write(json.dumps(content, indent = 4) + '\n')
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_file_name, self.cache_file_name)
         
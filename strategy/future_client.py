@@ -7,32 +7,93 @@ import time
 import logging as logger
 import json
 import signal
+from strategy.rate_limiter import PRIORITY_ORDER, PRIORITY_READ
+from strategy.metrics import timed_request
+from strategy.user_stream import parse_future_event
+
+# request weight of the futures rest api
+REQUEST_WEIGHT = {
+    'futures_order_book': 10,
+    'futures_account': 5,
+    'futures_get_open_orders': 1,
+    'futures_get_order': 1,
+    'futures_cancel_order': 1,
+    'futures_cancel_orders': 1,
+    'futures_cancel_all_open_orders': 1,
+    'futures_place_batch_order': 5,
+    'futures_create_order': 1,
+}
 
 class BNFClient:
+    # max orders of one batchOrders call
+    batch_order_size = 5
+    cancel_batch_size = 10
+
     def __init__(self, client):
         self._client = client
+        self.order_events = None
+        self.quote_cache = None
+        self.rate_limiter = None
+
+    def set_quote_cache(self, quote_cache):
+        self.quote_cache = quote_cache
+
+    def set_rate_limiter(self, rate_limiter):
+        self.rate_limiter = rate_limiter
+
+    def request(self, func, priority = PRIORITY_READ, key = None, **params):
+        timed = timed_request(func)
+        if self.rate_limiter is None:
+            return timed(**params)
+        weight = REQUEST_WEIGHT.get(func.__name__, 1)
+        return self.rate_limiter.call(self._client, weight, priority, key, timed, **params)
+
+    def set_order_events(self, order_events):
+        self.order_events = order_events
+
+    def start_user_stream(self, twm, order_events):
+        # order_events is the OrderEventHub of the api key, shared by every
+        # client on the key through set_order_events
+        self.order_events = order_events
+        twm.start_futures_user_socket(callback = self.on_user_event)
+
+    def on_user_event(self, msg):
+        self.order_events.on_message(msg, parse_future_event)
+
+    def subscribe_order_events(self, prefix):
+        if self.order_events is None:
+            return None
+        return self.order_events.subscribe(prefix)
 
     def trade_fee(self):
         return 0.00018
 
     def get_cur_sell(self, symbol):
-        depth = self._client.futures_order_book(symbol=symbol)
+        if self.quote_cache is not None:
+            r = self.quote_cache.get_cur_sell(symbol)
+            if r is not None:
+                return r
+        depth = self.request(self._client.futures_order_book, key = ('futures_order_book', symbol), symbol = symbol)
         if depth is None or 'asks' not in depth or len(depth['asks']) < 1:
             return None
         return depth['asks'][0]
 
     def get_cur_buy(self, symbol):
-        depth = self._client.futures_order_book(symbol=symbol)
+        if self.quote_cache is not None:
+            r = self.quote_cache.get_cur_buy(symbol)
+            if r is not None:
+                return r
+        depth = self.request(self._client.futures_order_book, key = ('futures_order_book', symbol), symbol = symbol)
         if depth is None or 'bids' not in depth or len(depth['bids']) < 1:
             return None
         return depth['bids'][0]
 
     def is_ok(self):
-        r = self._client.futures_account()
+        r = self.request(self._client.futures_account, key = ('futures_account', ))
         return r is not None and r.get('canTrade', False) is True;
 
     def get_asset_balance(self, symbol):
-        r = self._client.futures_account()
+        r = self.request(self._client.futures_account, key = ('futures_account', ))
         if r is None or 'assets' not in r:
             return None
         for tp in r.get('assets', []):
@@ -41,20 +102,47 @@ class BNFClient:
         return None
 
     def get_all_open_orders(self, symbol):
-        r = self._client.futures_get_open_orders(symbol = symbol)
+        r = self.request(self._client.futures_get_open_orders, key = ('futures_get_open_orders', symbol),
+                         symbol = symbol)
         res = [x for x in r if x['symbol'] == symbol]
         return res
 
     def get_order(self, symbol, order_id):
-        r = self._client.futures_get_order(symbol = symbol, origClientOrderId = order_id)
+        r = self.request(self._client.futures_get_order, key = ('futures_get_order', symbol, order_id),
+                         symbol = symbol, origClientOrderId = order_id)
         return r
 
     def cancel_order(self, symbol, order_id):
-        r = self._client.futures_cancel_order(symbol = symbol, origClientOrderId = order_id)
+        r = self.request(self._client.futures_cancel_order, priority = PRIORITY_ORDER,
+                         symbol = symbol, origClientOrderId = order_id)
+        return r
+
+    def cancel_orders(self, symbol, order_ids):
+        res = []
+        for i in range(0, len(order_ids), self.cancel_batch_size):
+            r = self.request(self._client.futures_cancel_orders, priority = PRIORITY_ORDER,
+                symbol = symbol, origclientorderidlist = order_ids[i:i + self.cancel_batch_size])
+            res.extend(r)
+        return res
+
+    def cancel_all_orders(self, symbol):
+        r = self.request(self._client.futures_cancel_all_open_orders, priority = PRIORITY_ORDER, symbol = symbol)
+        return r
+
+    def create_batch_limit_orders(self, symbol, orders, time_in_force = 'GTC'):
+        batch = [{
+            'symbol': symbol,
+            'side': od['side'],
+            'type': Client.ORDER_TYPE_LIMIT,
+            'timeInForce': time_in_force,
+            'quantity': str(od['quantity']),
+            'price': str(od['price']),
+            'newClientOrderId': od['client_order_id']} for od in orders]
+        r = self.request(self._client.futures_place_batch_order, priority = PRIORITY_ORDER, batchOrders = batch)
         return r
 
     def create_limit_order(self, symbol, side, quantity, price, client_order_id, time_in_force = 'GTC'):
-        r = self._client.futures_create_order(
+        r = self.request(self._client.futures_create_order, priority = PRIORITY_ORDER,
             symbol = symbol,
             side = side,
             quantity = quantity,
@@ -66,6 +154,6 @@ class BNFClient:
         return r
         
     def account_info(self):
-        r = self._client.futures_account()
+        r = self.request(self._client.futures_account, key = ('futures_account', ))
         print(r)
 
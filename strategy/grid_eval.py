@@ -0,0 +1,82 @@
+#! /usr/bin/python3
+import os
+import math
+import logging as logger
+import numpy as np
+from strategy.grid_v1 import build_flags
+
+# a pure grid replay in GridRun is independent per grid: grid i waits for
+# bid < buy price of flag i, then for ask > sell price of flag i + 1, and
+# gains a fixed amount on every round trip. so the total gain only depends
+# on how many times each grid alternates between the two levels.
+
+def grid_levels(config, trade_fee):
+    grid_num = config['grid_num']
+    price_round_num = config['price_round_num']
+    quantity_round_num = config['quantity_round_num']
+    buy_greedy_x = config.get('buy_greedy_x', 1.0)
+    sell_greedy_x = config.get('sell_greedy_x', 1.0)
+    flags = build_flags(config['low_bound'], config['up_bound'], grid_num,
+                        config.get('grid_mode', 'equal_percent'), price_round_num, trade_fee)
+    cash_per_flag = config['total_cash'] / grid_num
+    buy = [round(flags[i] * buy_greedy_x, price_round_num) for i in range(grid_num)]
+    sell = [round(flags[i + 1] * sell_greedy_x, price_round_num) for i in range(grid_num)]
+    qty = [round(cash_per_flag / fp, quantity_round_num) for fp in buy]
+    buy, sell, qty = np.array(buy), np.array(sell), np.array(qty)
+    gain = (sell - buy) * qty - (sell + buy) * qty * trade_fee
+    return buy, sell, gain
+
+def count_round_trip(k, m, grids):
+    # exact state walk for grids hit by both sides in one tick
+    res = []
+    for i in grids:
+        is_sell, cnt = False, 0
+        for t in np.nonzero((k <= i) | (m > i))[0]:
+            if not is_sell and k[t] <= i:
+                is_sell = True
+            elif is_sell and m[t] > i:
+                is_sell = False
+                cnt += 1
+        res.append(cnt)
+    return res
+
+def eval_round_trip(record, buy, sell, chunk_cells = 1 << 22):
+    # MockClient deals the ticks [0, len - 1), see has_next, and the deals of
+    # the last tick are never seen by GridRun.work_loop
+    n = max(0, len(record) - 2)
+    asks, bids = record.asks[:n], record.bids[:n]
+    grid_num = len(buy)
+    # grid i can buy at tick t when i >= k[t], can sell when i < m[t]
+    k = np.searchsorted(buy, bids, side = 'right')
+    m = np.searchsorted(sell, asks, side = 'left')
+    # repeated level of a tick changes no grid state
+    keep = np.ones(n, dtype = bool)
+    keep[1:] = (k[1:] != k[:-1]) | (m[1:] != m[:-1])
+    keep |= m > k
+    k, m = k[keep], m[keep]
+    rows = np.arange(grid_num)[:, None]
+    # state of each grid, -1 wait buy, 1 wait sell
+    state = np.full(grid_num, -1, dtype = np.int8)
+    cnt = np.zeros(grid_num, dtype = np.int64)
+    step = max(1, chunk_cells // max(1, grid_num))
+    for st in range(0, len(k), step):
+        ck, cm = k[st:st + step], m[st:st + step]
+        sig = (rows >= ck).astype(np.int8) - (rows < cm)
+        pos = np.where(sig != 0, np.arange(len(ck)), -1)
+        pos = np.maximum.accumulate(pos, axis = 1)
+        last = np.where(pos >= 0, np.take_along_axis(sig, np.maximum(pos, 0), axis = 1), state[:, None])
+        prev = np.concatenate([state[:, None], last[:, :-1]], axis = 1)
+        cnt += ((prev == 1) & (last == -1)).sum(axis = 1)
+        state = last[:, -1]
+    both = np.zeros(grid_num, dtype = bool)
+    for t in np.nonzero(m > k)[0]:
+        both[k[t]:m[t]] = True
+    if both.any():
+        grids = np.nonzero(both)[0]
+        cnt[grids] = count_round_trip(k, m, grids)
+    return cnt
+
+def eval_grid(record, config, trade_fee):
+    buy, sell, gain = grid_levels(config, trade_fee)
+    cnt = eval_round_trip(record, buy, sell)
+    return float((cnt * gain).sum())
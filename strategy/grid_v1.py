@@ -7,12 +7,55 @@ import time
 import logging as logger
 import json
 import signal
+import queue
 from strategy.file_cache import FileCache
 from strategy.mem_cache import MemCache
+from strategy.journal_cache import JournalCache
+from strategy.sqlite_cache import SqliteCache
+from strategy.order_record import OrderRecord, FlagOccupancy, STATUS_ERROR
+from strategy.metrics import LOOP_DURATION, FILL_LATENCY, RETRIES
+from strategy.profiler import profile_phase
+
+def build_flags(low_bound, up_bound, grid_num, grid_mode, price_round_num, trade_fee, verbose = False):
+    if grid_mode == 'equal_percent':
+        pper = math.pow(up_bound / low_bound, 1.0 / grid_num)
+        if pper - 2. * trade_fee <= 1.001:
+            raise Exception("grid too crowd")
+        if verbose:
+            logger.info("gain per grid without trade fee: %s", pper)
+        fp = low_bound
+        flags = [round(fp, price_round_num)]
+        for i in range(grid_num):
+            fp = fp * pper
+            clp = round(fp, price_round_num)
+            if clp == flags[-1]:
+                raise Exception("too close")
+            flags.append(clp)
+    elif grid_mode == 'equal_delta':
+        pdel = (up_bound - low_bound) * 1.0 / grid_num
+        if pdel / up_bound - 2. * trade_fee <= 0.001:
+            raise Exception("grid too crowd")
+        fp = low_bound
+        flags = [round(fp, price_round_num)]
+        for i in range(grid_num):
+            fp = fp + pdel
+            clp = round(fp, price_round_num)
+            if clp == flags[-1]:
+                raise Exception("too close")
+            flags.append(clp)
+    else:
+        raise Exception("unsupport grid mode %s" % (grid_mode))
+    return flags
+
+# order status of binance that still rests on the book
+OPEN_STATUS = ('NEW', 'PARTIALLY_FILLED', 'PENDING_CANCEL')
 
 class GridRun:
-    def __init__(self, client, config, verbose = True):
+    def __init__(self, client, config, verbose = True, order_snapshot = None, profiler = None):
         self.order_sleep = 0.01
+        self.profiler = profiler
+        self.order_snapshot = order_snapshot
+        self.last_order_time = 0.
         self.verbose = verbose
         self.client = client
         self.group = config.get('group', 'default')
@@ -31,65 +74,61 @@ class GridRun:
         self.run_target = config.get('run_target', 'join')
         self.trade_symbol = self.target_symbol + self.base_symbol
         self.cache_type = config.get('cache_type', 'file')
+        self.fill_mode = config.get('fill_mode', 'poll')
+        self.stream_check_interval = config.get('stream_check_interval', 60)
         if self.cache_type == 'file':
             self.cache_client = FileCache(self.strategy_id)
         elif self.cache_type == 'mem':
             self.cache_client = MemCache()
+        elif self.cache_type == 'journal':
+            self.cache_client = JournalCache(self.strategy_id)
+        elif self.cache_type == 'sqlite':
+            self.cache_client = SqliteCache(self.strategy_id, self.group, self.trade_symbol)
         else:
             raise Exception('unsupport cache type')
+        self.load_state()
+        if self.fill_mode == 'stream':
+            self.order_queue = self.client.subscribe_order_events(self.strategy_id + "_")
+            if self.order_queue is None:
+                logger.error("no user stream of %s, fall back to poll", self.strategy_id)
+                self.fill_mode = 'poll'
+        self.closed_orders = {}
+        self.last_poll = time.time()
             
         if self.run_target == "quit":
             logger.info("quit strategy of %s", self.strategy_id)
             self.quit_all()
             return
-        if self.grid_mode == 'equal_percent':
-            pper = math.pow(self.up_bound / self.low_bound, 1.0 / self.grid_num)
-            if pper - 2. * self.client.trade_fee() <= 1.001:
-                raise Exception("grid too crowd")
-            if self.verbose:
-                logger.info("gain per grid without trade fee: %s", pper)
-            fp = self.low_bound
-            self.flags = [round(fp, self.price_round_num)]
-            for i in range(self.grid_num):
-                fp = fp * pper
-                clp = round(fp, self.price_round_num)
-                if clp == self.flags[-1]:
-                    raise Exception("too close")
-                self.flags.append(clp)
-        elif self.grid_mode == 'equal_delta':
-            pdel = (self.up_bound - self.low_bound) * 1.0 / self.grid_num
-            if pdel / self.up_bound - 2. * self.client.trade_fee() <= 0.001:
-                raise Exception("grid too crowd")
-            fp = self.low_bound
-            self.flags = [round(fp, self.price_round_num)]
-            for i in range(self.grid_num):
-                fp = fp + self.pdel
-                clp = round(fp, self.price_round_num)
-                if clp == self.flags[-1]:
-                    raise Exception("too close")
-                self.flags.append(clp)
-        else:
-            raise Exception("unsupport grid mode %s" % (self.grid_mode))
+        self.flags = build_flags(self.low_bound, self.up_bound, self.grid_num, self.grid_mode,
+                                 self.price_round_num, self.client.trade_fee(), self.verbose)
         if self.verbose:        
             logger.info('all flag:%s grid_num %s', self.flags, self.grid_num)
         self.cash_per_flag = self.total_cash / self.grid_num
-        self.last_open_orders = self.load_orders()
         self.remote_open_orders = self.get_open_orders()
         rid = set([s['clientOrderId'] for s in self.remote_open_orders])
-        lid = set([s['clientOrderId'] for s in self.last_open_orders])
+        lid = set([s.cid for s in self.last_open_orders])
         rdl = set(rid) - set(lid)
         if len(rdl) > 0:
             logger.error("error remote order, delta: %s", rdl)
             raise Exception('error remote order')
-        self.total_gain = self.load_total_gain()
-        self.unique_order_id = self.load_unique_order_id()        
 
     def get_total_gain(self):
         return self.total_gain
 
+    def __getstate__(self):
+        # pickled by the backtest checkpoint together with its MockClient
+        if self.cache_type != 'mem' or self.fill_mode == 'stream':
+            raise Exception('only a mem cache poll mode GridRun can be checkpointed')
+        state = dict(self.__dict__)
+        state['profiler'] = None
+        return state
+
     def quit_all(self):
-        self.last_open_orders = self.load_orders()
         self.remote_open_orders = self.get_open_orders()
+        if self.remote_open_orders:
+            self.bulk_cancel(self.remote_open_orders)
+            self.remote_open_orders = self.get_open_orders()
+        # cancel the left one by one
         for od in self.remote_open_orders:
             while True:
                 try:
@@ -101,51 +140,93 @@ class GridRun:
                         break
                 except Exception as e:
                     logger.error(r)
-                time.sleep(self.order_sleep * 10)
-            time.sleep(self.order_sleep)
+                RETRIES.inc(self.strategy_id, 'cancel_order')
+                self.pause(10)
+            self.pause()
             if self.verbose:            
                 logger.info('cancel order %s', r)
         self.last_open_orders = []
-        self.save_last_open_orders()
+        self.occupancy.reset(self.flag_num())
+        self.commit()
         
+    def bulk_cancel(self, orders):
+        try:
+            # by client order id only, an order placed by hand or by another
+            # process on the key is not ours to cancel
+            self.client.cancel_orders(self.trade_symbol, [od['clientOrderId'] for od in orders])
+        except Exception as e:
+            logger.exception(e)
+        finally:
+            # after the cancel returned, a snapshot fetched while it was in flight is stale
+            self.last_order_time = time.time()
+
+    def pause(self, n = 1):
+        # order_sleep is 0 in backtests, skip the sleep syscall
+        if self.order_sleep > 0:
+            time.sleep(self.order_sleep * n)
+
     def get_local_cache(self):
         return self.cache_client.get_local_cache()
 
     def save_local_cache(self, content):
         self.cache_client.save_local_cache(content)
 
-    def load_total_gain(self):
-        cr = self.get_local_cache()
-        return cr.get('total_gain', 0.)
-
-    def save_total_gain(self):
-        cr = self.get_local_cache()
-        cr['total_gain'] = self.total_gain
-        self.save_local_cache(cr)
+    @profile_phase('load_state')
+    def load_state(self):
+        # state is kept in memory, loaded once here and written back by commit
+        self.cache_state = self.get_local_cache()
+        self.last_open_orders = [OrderRecord.load(od) for od in self.cache_state.get('open_orders', [])]
+        self.total_gain = self.cache_state.get('total_gain', 0.)
+        self.unique_order_id = self.cache_state.get('unique_order_id', 0)
+        self.occupancy = FlagOccupancy(self.flag_num(), self.last_open_orders)
 
-    def load_unique_order_id(self):
-        cr = self.get_local_cache()
-        return cr.get('unique_order_id', 0)
+    def flag_num(self):
+        # buy orders sit on flag 0 to grid_num - 1, sell orders on 1 to grid_num
+        return (self.grid_num or 0) + 1
 
-    def save_unique_order_id(self):
-        cr = self.get_local_cache()
-        cr['unique_order_id'] = self.unique_order_id
-        self.save_local_cache(cr)
-        
-    def load_orders(self):
-        cr = self.get_local_cache()
-        return cr.get('open_orders', [])
+    @profile_phase('commit')
+    def commit(self):
+        # one save of the whole state per cycle
+        content = dict(self.cache_state)
+        content['open_orders'] = [od.dump() for od in self.last_open_orders]
+        content['total_gain'] = self.total_gain
+        content['unique_order_id'] = self.unique_order_id
+        # the rollback point even when the save fails, the orders in it are
+        # sent already and the next commit writes them again
+        self.cache_state = content
+        self.save_local_cache(content)
 
-    def save_last_open_orders(self):
-        cr = self.get_local_cache()
-        cr['open_orders'] = self.last_open_orders
-        self.save_local_cache(cr)
+    def rollback(self):
+        # back to the last commit, which holds every sent order. unique_order_id
+        # is kept, the ids may already be sent to exchange
+        self.last_open_orders = [OrderRecord.load(od) for od in self.cache_state.get('open_orders', [])]
+        self.total_gain = self.cache_state.get('total_gain', 0.)
+        self.occupancy.reset(self.flag_num(), self.last_open_orders)
 
+    @profile_phase('fetch_orders')
     def get_open_orders(self):
+        if self.order_snapshot is not None:
+            return self.order_snapshot.get_orders(self.client, self.trade_symbol, self.strategy_id, self.last_order_time)
         orders = self.client.get_all_open_orders(self.trade_symbol)
         ret = [ord for ord in orders if ord['clientOrderId'].startswith(self.strategy_id + "_")]
         return ret
     
+    def drain_order_events(self):
+        lid = set([s.cid for s in self.last_open_orders])
+        self.closed_orders = dict((k, v) for k, v in self.closed_orders.items() if k in lid)
+        while True:
+            try:
+                ev = self.order_queue.get_nowait()
+            except queue.Empty:
+                break
+            if ev['clientOrderId'] in lid and ev['status'] in ('FILLED', 'CANCELED', 'EXPIRED', 'REJECTED'):
+                self.closed_orders[ev['clientOrderId']] = ev
+
+    def get_stream_open_orders(self):
+        # a failed placement is not open, check_and_commit places it again
+        return [od.to_order() for od in self.last_open_orders
+                if od.cid not in self.closed_orders and od.status != STATUS_ERROR]
+
     def get_cur_balance(self):
         asset = self.client.get_asset_balance(self.symbol)
         return float(asset['free']) + float(asset['locked'])
@@ -159,11 +240,15 @@ class GridRun:
         return float(mk[0])
 
     #    def create_limit_order(self, symbol, side, quantity, price, client_order_id, time_in_force = 'GTC'):
-    def create_order(self, side, quantity, price, flag_id):
+    def new_order_id(self, side, quantity, flag_id):
         qstr = str(quantity).split('.')
         tstr = str(int(time.time() / 3600)) + str(self.unique_order_id)
         oid = '%s_%s_%s_%s_%s_%s' % (self.strategy_id, str(flag_id), qstr[0], qstr[1], tstr, str(side))
         self.unique_order_id += 1
+        return oid
+
+    def create_order(self, side, quantity, price, flag_id):
+        oid = self.new_order_id(side, quantity, flag_id)
         if self.verbose:
             logger.info('try to order %s %s %s %s %s', side, quantity, price, flag_id, oid)
         rtc = 10
@@ -173,7 +258,7 @@ class GridRun:
                 r = self.client.create_limit_order(
                     symbol = self.trade_symbol,
                     side = side, quantity = quantity, price = price, client_order_id = oid)
-                time.sleep(self.order_sleep * 10)
+                self.pause(10)
                 crtc = 10
                 if self.verbose:
                     logger.info(r)
@@ -182,37 +267,114 @@ class GridRun:
                     if ro is not None and ro.get('clientOrderId') == oid:
                         if self.verbose:                        
                             logger.info('suc to order %s %s %s %s', side, quantity, price, flag_id)
-                        return r
+                        # the order is on the exchange, older snapshots miss it
+                        self.last_order_time = time.time()
+                        return OrderRecord(oid, side, flag_id, quantity, price)
                     crtc -= 1
-                    time.sleep(self.order_sleep * 10)
+                    RETRIES.inc(self.strategy_id, 'order_confirm')
+                    self.pause(10)
                 raise Exception("create order check failed")
             except Exception as e:
                 logger.exception(e)
+                RETRIES.inc(self.strategy_id, 'create_order')
                 last_exp = e
-                time.sleep(self.order_sleep * 10)
+                self.pause(10)
             rtc -= 1
         logger.exception(last_exp)
-        rep = {
-            "od_error":str(last_exp),
-            "side": side,
-            "origQty": quantity,
-            "price": price,
-            "clientOrderId": oid}
-        return rep
+        # a failed try may still have placed it
+        self.last_order_time = time.time()
+        return OrderRecord(oid, side, flag_id, quantity, price, STATUS_ERROR)
+        
+    @profile_phase('place')
+    def create_orders(self, reqs):
+        # reqs of (side, quantity, price, flag_id), sent without waiting for
+        # each order and checked together after, by batch when the client supports
+        if len(reqs) <= 1:
+            return [self.create_order(*req) for req in reqs]
+        bs = self.client.batch_order_size
+        reqs = [req + (self.new_order_id(req[0], req[1], req[3]), ) for req in reqs]
+        placed = {}
+        if bs <= 1:
+            for i, (side, quantity, price, flag_id, oid) in enumerate(reqs):
+                # same pace as create_order, only its confirm is left out
+                if i > 0:
+                    self.pause(10)
+                try:
+                    placed[oid] = self.client.create_limit_order(
+                        symbol = self.trade_symbol,
+                        side = side, quantity = quantity, price = price, client_order_id = oid)
+                except Exception as e:
+                    logger.exception(e)
+        else:
+            for i in range(0, len(reqs), bs):
+                batch = reqs[i:i + bs]
+                try:
+                    rs = self.client.create_batch_limit_orders(self.trade_symbol, [
+                        {'side': side, 'quantity': quantity, 'price': price, 'client_order_id': oid}
+                        for side, quantity, price, flag_id, oid in batch])
+                except Exception as e:
+                    logger.exception(e)
+                    rs = []
+                for r in rs:
+                    if r and 'clientOrderId' in r and 'code' not in r:
+                        placed[r['clientOrderId']] = r
+                    else:
+                        logger.error('batch order failed %s', r)
+        self.last_order_time = time.time()
+        self.pause(10)
+        # one open orders query checks them all, when it fails each order is
+        # looked up by itself, they may be live already
+        try:
+            rid = set([s['clientOrderId'] for s in self.get_open_orders()])
+        except Exception as e:
+            logger.exception(e)
+            rid = set()
+        ret = []
+        for side, quantity, price, flag_id, oid in reqs:
+            # open on the exchange whatever the batch response said, a lost
+            # response or a timeout may follow an accepted batch
+            if oid in rid:
+                ret.append(OrderRecord(oid, side, flag_id, quantity, price))
+                continue
+            # dealed already, lost or never placed
+            try:
+                ro = self.client.get_order(symbol = self.trade_symbol, order_id = oid)
+                if ro is not None and ro.get('clientOrderId') == oid:
+                    ret.append(OrderRecord(oid, side, flag_id, quantity, price))
+                    continue
+            except BinanceAPIException as e:
+                if e.code != -2013:
+                    logger.exception(e)
+            except Exception as e:
+                logger.exception(e)
+            ret.append(self.create_order(side, quantity, price, flag_id))
+        if self.verbose:
+            logger.info('orders %s placed %s', len(reqs), len(placed))
+        return ret
         
+    @profile_phase('place')
     def init_order(self):
+        reqs = []
         for fid in range(self.grid_num):
             fp = round(self.flags[fid] * self.buy_greedy_x, self.price_round_num)
             if self.verbose:            
                 logger.info('init order of %s', self.flags[fid])
             qua = round(self.cash_per_flag / fp, self.quantity_round_num)
-            ret = self.create_order(Client.SIDE_BUY, qua, fp, fid)
+            reqs.append((Client.SIDE_BUY, qua, fp, fid))
+        for ret in self.create_orders(reqs):
             self.last_open_orders.append(ret)
-            if 'od_error' in ret:
-                logger.error('flag %s order failed %s', fp, ret['od_error'])
-        self.save_last_open_orders()
+            self.occupancy.add(ret)
+            if ret.status == STATUS_ERROR:
+                logger.error('flag %s order failed', ret.price)
+        self.commit()
 
     def check_order_dealed(self, cid):
+        ev = self.closed_orders.get(cid)
+        if ev is not None:
+            dealed = float(ev.get('executedQty', -1.0)) >= float(ev.get('origQty', 0.0)) - 1e-8 and ev.get('status', '') == 'FILLED'
+            if dealed and ev.get('time'):
+                FILL_LATENCY.observe(time.time() - ev['time'] / 1000., self.strategy_id, 'stream')
+            return dealed
         # until success
         while True:
             try:
@@ -220,18 +382,34 @@ class GridRun:
                 if 'symbol' not in r:
                     return False
                 if float(r.get('executedQty', -1.0)) >= float(r.get('origQty', 0.0)) - 1e-8 and r.get('status', '') == 'FILLED':
+                    if r.get('updateTime'):
+                        FILL_LATENCY.observe(time.time() - r['updateTime'] / 1000., self.strategy_id, 'poll')
                     return True
-                if r.get('status', '') == 'CANCELED':
-                    return False
+                if r.get('status', '') in OPEN_STATUS:
+                    break
+                return False
             except BinanceAPIException as e:
                 if e.code == -2013:
                     return False
                 logger.error(e)
-                time.sleep(self.order_sleep)                
+                RETRIES.inc(self.strategy_id, 'check_order')
+                self.pause()                
             except Exception as e:
                 logger.error(e)
-                time.sleep(self.order_sleep)
-        return False
+                RETRIES.inc(self.strategy_id, 'check_order')
+                self.pause()
+        # still open, the open orders were fetched before it was placed, the
+        # loop rolls back and checks again next time
+        self.pause()
+        raise Exception('order %s is still open' % cid)
+
+    def is_order_open(self, cid):
+        try:
+            r = self.client.get_order(self.trade_symbol, cid)
+            return r.get('clientOrderId') == cid and r.get('status', '') in OPEN_STATUS
+        except Exception as e:
+            logger.error(e)
+            return False
 
     def get_sell_price(self, flag_id):
         fp = round(self.flags[flag_id] * self.sell_greedy_x, self.price_round_num)
@@ -241,104 +419,104 @@ class GridRun:
         fp = round(self.flags[flag_id] * self.buy_greedy_x, self.price_round_num)
         return fp
 
-    def check_and_commit(self):
-        self.last_open_orders = self.load_orders()
-        self.remote_open_orders = self.get_open_orders()        
+    @profile_phase('reconcile')
+    def check_and_commit(self, remote_open_orders = None):
+        if remote_open_orders is None:
+            remote_open_orders = self.get_open_orders()
+        self.remote_open_orders = remote_open_orders
         rid = set([s['clientOrderId'] for s in self.remote_open_orders])
-        lid = set([s['clientOrderId'] for s in self.last_open_orders])
+        lid = set([s.cid for s in self.last_open_orders])
         if self.verbose:        
             logger.info("l-r:%s",set(lid) - set(rid))
             logger.info("r-l:%s",set(rid) - set(lid))
         lmap = {}
         for s in self.last_open_orders:
-            lmap[s['clientOrderId']] = s
+            lmap[s.cid] = s
         new_last_open_orders = []
+        reqs = []
         for cid in lid:
             if cid in rid:
                 new_last_open_orders.append(lmap[cid])
                 continue
             od = lmap[cid]
-            content = cid.split('_')
-            qty = float(content[2] + '.' + content[3])
-            flag_id = int(content[1])
+            if od.status == STATUS_ERROR and self.is_order_open(cid):
+                # the failed placement reached the exchange, the stream
+                # view leaves it out, keep it as a normal order
+                new_last_open_orders.append(OrderRecord(od.cid, od.side, od.flag_id, od.qty, od.price))
+                continue
+            self.occupancy.remove(od)
+            qty = od.qty
+            flag_id = od.flag_id
             if self.verbose:            
                 logger.info('lost order cid %s order:%s', cid, od)
-            if 'od_error' in od or not self.check_order_dealed(cid):
-                fp = od['price']
-                if od['side'] == Client.SIDE_BUY:
+            if od.status == STATUS_ERROR or not self.check_order_dealed(cid):
+                if od.side == Client.SIDE_BUY:
                     fp = self.get_buy_price(flag_id)
                 else:
                     fp = self.get_sell_price(flag_id)
-                rqty = round(float(od['origQty']), self.quantity_round_num)
-                ret = self.create_order(od['side'], rqty, fp, flag_id)
-                new_last_open_orders.append(ret)
-            elif od['side'] == Client.SIDE_BUY:
+                rqty = round(qty, self.quantity_round_num)
+                reqs.append((od.side, rqty, fp, flag_id))
+            elif od.side == Client.SIDE_BUY:
                 sell_flag_id = flag_id + 1
                 fp = self.get_sell_price(sell_flag_id)
-                ret = self.create_order(Client.SIDE_SELL, qty, fp, sell_flag_id)
-                new_last_open_orders.append(ret)
-            elif od['side'] == Client.SIDE_SELL:
+                reqs.append((Client.SIDE_SELL, qty, fp, sell_flag_id))
+            elif od.side == Client.SIDE_SELL:
                 buy_flag_id = flag_id - 1
                 fp = self.get_buy_price(buy_flag_id)                
                 qua = round(self.cash_per_flag / fp, self.quantity_round_num)
-                ret = self.create_order(Client.SIDE_BUY, qua, fp, buy_flag_id)
-                new_last_open_orders.append(ret)
-                op = float(od['price'])
+                reqs.append((Client.SIDE_BUY, qua, fp, buy_flag_id))
+                op = od.price
                 cur_gain = (op - fp) * qty - (op + fp) * qty * self.client.trade_fee()
                 self.total_gain += cur_gain
-                self.save_total_gain()
+        new_orders = self.create_orders(reqs)
+        for od in new_orders:
+            self.occupancy.add(od)
+        new_last_open_orders.extend(new_orders)
         self.last_open_orders = new_last_open_orders
-        self.save_last_open_orders()
-        self.save_unique_order_id()        
-        if len(self.load_orders()) == self.grid_num:
+        # committed before the missing grid pass, a raise in it must not
+        # roll back the orders just sent
+        self.commit()
+        if len(self.last_open_orders) == self.grid_num:
             return
-        self.last_open_orders = self.load_orders()
-        id_orders = {}
-        for od in self.last_open_orders:
-            if 'od_error' in od:
-                pass
-            i = int(od['clientOrderId'].split('_')[1])
-            if i not in id_orders:
-                id_orders[i] = [od]
-            else:
-                id_orders[i].append(od)
-        for i in range(self.grid_num):
-            if i in id_orders:
-                has_buy = False
-                for od in id_orders[i]:
-                    if od['side'] == Client.SIDE_BUY:
-                        has_buy = True
-                if has_buy:
-                    continue
-                continue
-            if i + 1 in id_orders:
-                has_sell = False
-                for od in id_orders[i + 1]:
-                    if od['side'] == Client.SIDE_SELL:
-                        has_sell = True
-                if has_sell:
-                    continue
+        reqs = []
+        for i in self.occupancy.missing(self.grid_num):
             fp = round(self.flags[i] * self.buy_greedy_x, self.price_round_num)
             if self.verbose:            
                 logger.info('reorder missing order of %s', self.flags[i])
             qua = round(self.cash_per_flag / fp, self.quantity_round_num)
-            ret = self.create_order(Client.SIDE_BUY, qua, fp, i)
-            self.last_open_orders.append(ret)
-            time.sleep(self.order_sleep * 10)
-        self.save_last_open_orders()
-        self.save_unique_order_id()
+            reqs.append((Client.SIDE_BUY, qua, fp, i))
+        new_orders = self.create_orders(reqs)
+        for od in new_orders:
+            self.occupancy.add(od)
+        self.last_open_orders.extend(new_orders)
+        self.commit()
+
+    def stream_loop(self):
+        # fills come from the user stream, no rest call unless something dealed
+        self.drain_order_events()
+        if self.closed_orders or any(od.status == STATUS_ERROR for od in self.last_open_orders):
+            self.check_and_commit(self.get_stream_open_orders())
     
+    @profile_phase('work_loop')
     def work_loop(self):
         if self.run_target == 'quit':
             return
+        st = time.time()
         try:
-            self.last_open_orders = self.load_orders()
+            if self.fill_mode == 'stream' and len(self.last_open_orders) > 0:
+                # still poll rest sometimes, the stream may lose events when reconnecting
+                if time.time() - self.last_poll < self.stream_check_interval:
+                    self.stream_loop()
+                    return
+                self.drain_order_events()
+                self.last_poll = time.time()
             self.remote_open_orders = self.get_open_orders()
             if len(self.last_open_orders) == 0:
                 ## firstly commit all buy order
                 self.init_order()
+                self.remote_open_orders = self.get_open_orders()
             rid = set([s['clientOrderId'] for s in self.remote_open_orders])
-            lid = set([s['clientOrderId'] for s in self.last_open_orders])
+            lid = set([s.cid for s in self.last_open_orders])
             rdl = set(rid) - set(lid)
             if len(rdl) > 0:
                 logger.error("error remote order, delta: %s", rdl)
@@ -346,8 +524,11 @@ class GridRun:
             ldl = set(lid) - set(rid)
             if len(ldl) > 0:
                 # check dealed order and commit
-                self.check_and_commit()
+                self.check_and_commit(self.remote_open_orders)
 
         except Exception as e:
             logger.exception(e)
+            self.rollback()
+        finally:
+            LOOP_DURATION.observe(time.time() - st, self.strategy_id)
 
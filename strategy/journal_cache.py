@@ -0,0 +1,154 @@
+#! /usr/bin/python3
+import os
+import math
+import time
+import logging as logger
+import json
+from strategy.order_record import order_cid
+
+# state is a snapshot plus an append only journal of deltas, one journal
+# record per save, open orders are journaled by clientOrderId
+class JournalCache:
+    def __init__(self, file_name, fsync_interval = 1.0, compact_records = 1000):
+        self.file_name = file_name
+        self.fsync_interval = fsync_interval
+        self.compact_records = compact_records
+        cache_dir = os.path.abspath(os.path.join(os.path.dirname(
+                    os.path.realpath(__file__)), '../data'))
+        if not os.path.exists(cache_dir):
+            os.mkdir(cache_dir)
+        self.cache_dir = cache_dir
+        self.cache_file_name = os.path.join(cache_dir, self.file_name + '.data')
+        self.snap_file_name = os.path.join(cache_dir, self.file_name + '.snap')
+        self.journal_file_name = os.path.join(cache_dir, self.file_name + '.journal')
+        self.seq = 0
+        self.values = {}
+        self.orders = None
+        self.records = 0
+        self.recover()
+        self.fh = open(self.journal_file_name, 'a')
+        self.last_sync = time.time()
+
+    def load_content(self, content):
+        self.values = dict((k, json.dumps(v)) for k, v in content.items() if k != 'open_orders')
+        self.orders = None
+        if 'open_orders' in content:
+            self.orders = dict((order_cid(od), json.dumps(od)) for od in content['open_orders'])
+
+    def recover(self):
+        if os.path.exists(self.snap_file_name):
+            with open(self.snap_file_name, 'r') as fh:
+                snap = json.loads(fh.read())
+            self.seq = snap['seq']
+            self.load_content(snap['content'])
+        elif os.path.exists(self.cache_file_name):
+            # migrate from the file cache
+            with open(self.cache_file_name, 'r') as fh:
+                con = fh.read()
+            if len(con) >= 2:
+                self.load_content(json.loads(con))
+        if not os.path.exists(self.journal_file_name):
+            return
+        good_size = 0
+        with open(self.journal_file_name, 'rb') as fh:
+            for line in fh:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                good_size += len(line)
+                if rec['seq'] <= self.seq:
+                    continue
+                self.apply(rec)
+                self.records += 1
+        if good_size < os.path.getsize(self.journal_file_name):
+            # drop the torn record of a crash
+            logger.error('truncate torn journal %s at %s', self.journal_file_name, good_size)
+            with open(self.journal_file_name, 'r+b') as fh:
+                fh.truncate(good_size)
+
+    def apply(self, rec):
+        encode = lambda m: dict((k, json.dumps(v)) for k, v in m.items())
+        orders = encode(rec['orders']) if 'orders' in rec else None
+        self.update(rec['seq'], encode(rec.get('set', {})), rec.get('unset', []),
+                    orders, rec.get('del', []), encode(rec.get('add', {})))
+
+    def update(self, seq, sets, unset, orders, dels, adds):
+        self.seq = seq
+        self.values.update(sets)
+        for k in unset:
+            self.values.pop(k, None)
+        if orders is not None:
+            self.orders = orders
+        if dels or adds:
+            if self.orders is None:
+                self.orders = {}
+            for cid in dels:
+                self.orders.pop(cid, None)
+            self.orders.update(adds)
+
+    def get_local_cache(self):
+        content = dict((k, json.loads(v)) for k, v in self.values.items())
+        if self.orders is not None:
+            content['open_orders'] = [json.loads(v) for v in self.orders.values()]
+        return content
+
+    def save_local_cache(self, content):
+        values = dict((k, json.dumps(v)) for k, v in content.items() if k != 'open_orders')
+        sets = dict((k, v) for k, v in values.items() if self.values.get(k) != v)
+        unset = [k for k in self.values if k not in values]
+        orders, dels, adds = None, [], {}
+        if 'open_orders' in content:
+            objs = dict((order_cid(od), od) for od in content['open_orders'])
+            encoded = dict((cid, json.dumps(od)) for cid, od in objs.items())
+            if self.orders is None:
+                orders = encoded
+            else:
+                dels = [cid for cid in self.orders if cid not in encoded]
+                adds = dict((cid, v) for cid, v in encoded.items() if self.orders.get(cid) != v)
+        if not sets and not unset and orders is None and not dels and not adds:
+            return
+        rec = {'seq': self.seq + 1}
+        if sets:
+            rec['set'] = dict((k, content[k]) for k in sets)
+        if unset:
+            rec['unset'] = unset
+        if orders is not None:
+            rec['orders'] = objs
+        if dels:
+            rec['del'] = dels
+        if adds:
+            rec['add'] = dict((cid, objs[cid]) for cid in adds)
+        self.fh.write(json.dumps(rec, separators = (',', ':')) + '\n')
+        self.fh.flush()
+        self.update(rec['seq'], sets, unset, orders, dels, adds)
+        self.records += 1
+        if time.time() - self.last_sync >= self.fsync_interval:
+            self.sync()
+        if self.records >= self.compact_records:
+            self.compact()
+
+    def sync(self):
+        self.fh.flush()
+        os.fsync(self.fh.fileno())
+        self.last_sync = time.time()
+
+    def compact(self):
+        tmp_file_name = self.snap_file_name + '.tmp'
+        with open(tmp_file_name, 'w') as fh:
+            fh.write(json.dumps({'seq': self.seq, 'content': self.get_local_cache()}) + '\n')
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_file_name, self.snap_file_name)
+        dfd = os.open(self.cache_dir, os.O_RDONLY)
+        try:
+            os.fsync(dfd)
+        finally:
+            os.close(dfd)
+        # the journal records are covered by the snapshot seq from now on
+        self.fh.close()
+        self.fh = open(self.journal_file_name, 'w')
+        self.sync()
+        self.records = 0
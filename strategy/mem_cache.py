@@ -9,13 +9,62 @@ import json
 import copy
 import signal
 
+SCALAR_TYPES = (str, int, float, bool, type(None))
+
+class FrozenDict(dict):
+    def readonly(self, *args, **kwargs):
+        raise TypeError('state of MemCache is read only')
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = readonly
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self), ))
+
+# the saved state is frozen: lists become tuples and dicts FrozenDict, so a
+# snapshot is shared instead of copied on read and on the next save. A value
+# already frozen by the last save (a tuple or a dict given back by get, or
+# the same order tuple saved again) is kept as it is, a save only walks the
+# values that changed
 class MemCache:
     def __init__(self):
-        self.content = {}
-        
+        self.content = FrozenDict()
+        self.frozen = set()
+
+    def freeze(self, value, frozen):
+        if isinstance(value, SCALAR_TYPES):
+            return value
+        if id(value) in self.frozen:
+            # alive as self.content still holds it
+            frozen.add(id(value))
+            return value
+        if isinstance(value, dict):
+            ret = FrozenDict((k, self.freeze(v, frozen)) for k, v in value.items())
+        elif isinstance(value, tuple):
+            items = tuple(self.freeze(v, frozen) for v in value)
+            ret = value if all(a is b for a, b in zip(items, value)) else items
+        elif isinstance(value, list):
+            ret = tuple(self.freeze(v, frozen) for v in value)
+        else:
+            return copy.deepcopy(value)
+        frozen.add(id(ret))
+        return ret
+
+    def __getstate__(self):
+        # ids of the frozen values mean nothing after a pickle
+        return {'content': self.content}
+
+    def __setstate__(self, state):
+        self.content = FrozenDict()
+        self.frozen = set()
+        self.save_local_cache(state['content'])
+
     def get_local_cache(self):
-        return self.content
+        return dict(self.content)
 
     def save_local_cache(self, content):
-        self.content = copy.deepcopy(content)
-        
+        frozen = set()
+        self.content = self.freeze(content, frozen)
+        self.frozen = frozen
@@ -0,0 +1,172 @@
+#! /usr/bin/python3
+import os
+import time
+import bisect
+import threading
+import logging as logger
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# seconds, the last bucket catches everything slower
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., float('inf'))
+
+def format_labels(names, values, extra = ''):
+    pairs = ['%s="%s"' % (n, v) for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(pairs) + '}'
+
+def format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+# bucket counts per label values, observe is a bisect and a locked add so it
+# stays on in production
+class Histogram:
+    def __init__(self, name, help, label_names = (), buckets = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            s = self.series.get(labels)
+            if s is None:
+                s = self.series[labels] = [[0] * len(self.buckets), 0., 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def quantile(self, counts, total, q):
+        # upper bound of the bucket holding the quantile
+        acc = 0
+        for bound, c in zip(self.buckets, counts):
+            acc += c
+            if acc >= total * q:
+                return bound
+        return self.buckets[-1]
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+        with self.lock:
+            series = [(k, list(v[0]), v[1], v[2]) for k, v in self.series.items()]
+        for labels, counts, total, n in series:
+            acc = 0
+            for bound, c in zip(self.buckets, counts):
+                acc += c
+                lines.append('%s_bucket%s %d' % (self.name, format_labels(
+                    self.label_names, labels, 'le="%s"' % format_bound(bound)), acc))
+            lines.append('%s_sum%s %r' % (self.name, format_labels(self.label_names, labels), total))
+            lines.append('%s_count%s %d' % (self.name, format_labels(self.label_names, labels), n))
+        return lines
+
+    def summary(self):
+        ret = []
+        with self.lock:
+            series = [(k, list(v[0]), v[1], v[2]) for k, v in self.series.items()]
+        for labels, counts, total, n in series:
+            ret.append('%s%s n=%d avg=%.1fms p50<=%s p99<=%s' % (
+                self.name, format_labels(self.label_names, labels), n, total / n * 1000.,
+                format_bound(self.quantile(counts, n, 0.5)), format_bound(self.quantile(counts, n, 0.99))))
+        return ret
+
+class Counter:
+    def __init__(self, name, help, label_names = ()):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def inc(self, *labels):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + 1
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s counter' % self.name]
+        with self.lock:
+            series = list(self.series.items())
+        for labels, v in series:
+            lines.append('%s%s %d' % (self.name, format_labels(self.label_names, labels), v))
+        return lines
+
+    def summary(self):
+        with self.lock:
+            series = list(self.series.items())
+        return ['%s%s=%d' % (self.name, format_labels(self.label_names, labels), v) for labels, v in series]
+
+class MetricRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def histogram(self, name, help, label_names = (), buckets = LATENCY_BUCKETS):
+        m = Histogram(name, help, label_names, buckets)
+        self.metrics.append(m)
+        return m
+
+    def counter(self, name, help, label_names = ()):
+        m = Counter(name, help, label_names)
+        self.metrics.append(m)
+        return m
+
+    def render(self):
+        lines = []
+        for m in self.metrics:
+            lines.extend(m.render())
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        ret = []
+        for m in self.metrics:
+            ret.extend(m.summary())
+        return '; '.join(ret)
+
+registry = MetricRegistry()
+
+REST_LATENCY = registry.histogram('grid_rest_request_seconds', 'latency of rest requests', ('endpoint', ))
+REST_ERRORS = registry.counter('grid_rest_errors_total', 'failed rest requests', ('endpoint', ))
+LOOP_DURATION = registry.histogram('grid_work_loop_seconds', 'duration of one work_loop', ('strategy', ))
+FILL_LATENCY = registry.histogram('grid_fill_latency_seconds',
+                                  'exchange fill time to the strategy reacting on it', ('strategy', 'source'))
+RETRIES = registry.counter('grid_retries_total', 'retries of order placement and queries', ('strategy', 'op'))
+
+def timed_request(func):
+    # rest call of the binance client with its latency and errors recorded
+    endpoint = func.__name__
+    def timed(**params):
+        st = time.time()
+        try:
+            return func(**params)
+        except Exception:
+            REST_ERRORS.inc(endpoint)
+            raise
+        finally:
+            REST_LATENCY.observe(time.time() - st, endpoint)
+    return timed
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port, host = '127.0.0.1'):
+    # serves /metrics in the prometheus text format from a daemon thread
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    th = threading.Thread(target = server.serve_forever, daemon = True)
+    th.start()
+    logger.info('metrics on http://%s:%s/metrics', host, port)
+    return server
@@ -7,16 +7,16 @@ import time
 import logging as logger
 import json
 import signal
+import bisect
+from strategy.tick_record import TickRecord
+from strategy.user_stream import OrderEventHub
 
 class MockClient:
-    def __init__(self, record_file, target_symbol, base_symbol, max_line = 100000):
-        self.record = []
-        with open(record_file, 'r') as fh:
-            for line in fh.readlines():
-                content = line.split(' ')
-                self.record.append([float(content[1]), float(content[2])])
-                if len(self.record) >= max_line:
-                    break
+    def __init__(self, record_file, target_symbol, base_symbol, max_line = 100000, batch_order_size = 1):
+        if isinstance(record_file, TickRecord):
+            self.record = record_file
+        else:
+            self.record = TickRecord(record_file, max_line)
         self.cur_index = 0
         self.base_val = 1000000.
         self.target_val = 0.
@@ -24,29 +24,97 @@ class MockClient:
         self.base_symbol = base_symbol
         self.close_orders = {}
         self.open_orders = {}
+        # price sorted books of (price, seq, client_order_id), seq keeps the
+        # fill order same as the open_orders insertion order
+        self.sell_book = []
+        self.buy_book = []
+        self.book_keys = {}
+        self.order_seq = 0
+        # open orders by strategy id, the strategies of a multiplexed
+        # backtest read their own orders without scanning the others
+        self.strategy_orders = {}
+        # strategy ids with orders dealt or canceled since pop_touched
+        self.touched = set()
+        # local fake of the user data stream
+        self.order_events = None
+        # more than 1 places by create_batch_limit_orders like the futures client
+        self.batch_order_size = batch_order_size
+
+    def __getstate__(self):
+        # the record is given again on resume, the checkpoint keeps its digest
+        if self.order_events is not None:
+            raise Exception('MockClient with order event listeners can not be checkpointed')
+        state = dict(self.__dict__)
+        state['record'] = None
+        return state
+
+    def subscribe_order_events(self, prefix):
+        if self.order_events is None:
+            self.order_events = OrderEventHub()
+        return self.order_events.subscribe(prefix)
+
+    def push_order_event(self, order):
+        if self.order_events is None:
+            return
+        # no fill time, the fill latency of a backtest means nothing
+        self.order_events.dispatch(dict(order))
+
+    def pop_open_order(self, oid):
+        order = self.open_orders.pop(oid)
+        sid = oid.rsplit('_', 5)[0]
+        del self.strategy_orders[sid][oid]
+        self.touched.add(sid)
+        return order
+
+    def pop_touched(self):
+        touched, self.touched = self.touched, set()
+        return touched
+
+    def get_orders(self, client, symbol, strategy_id, min_time = 0.):
+        # same as OpenOrderSnapshot.get_orders, always up to date
+        return list(self.strategy_orders.get(strategy_id, {}).values())
+
+    def book_of(self, side):
+        if side == 'SELL':
+            return self.sell_book
+        return self.buy_book
 
     def next(self):
         sell_price = self.get_cur_sell('')
         buy_price = self.get_cur_buy('')
-        sr = []
-        for oid in self.open_orders.keys():
-            order = self.open_orders[oid]
-            if order['side'] == 'SELL' and order['price'] < sell_price:
-                sr.append(oid)
+        # sell order deal when price < sell_price, buy order deal when price > buy_price
+        si = bisect.bisect_left(self.sell_book, (sell_price,))
+        bi = bisect.bisect_right(self.buy_book, (buy_price, float('inf')))
+        if si == 0 and bi == len(self.buy_book):
+            self.cur_index += 1
+            return
+        sr = self.sell_book[:si] + self.buy_book[bi:]
+        del self.sell_book[:si]
+        del self.buy_book[bi:]
+        sr.sort(key = lambda x: x[1])
+        for _, _, oid in sr:
+            order = self.pop_open_order(oid)
+            self.book_keys.pop(oid)
+            if order['side'] == 'SELL':
                 self.base_val += order['price'] * order['origQty'] * (1.0 - self.trade_fee())
                 self.target_val -= order['origQty']
-                self.open_orders[oid]['executedQty'] = order['origQty']
-                self.open_orders[oid]['status'] = 'FILLED'
-            elif order['side'] == 'BUY' and order['price'] > buy_price:
-                sr.append(oid)
+            else:
                 self.base_val -= order['price'] * order['origQty'] * (1.0 + self.trade_fee())
                 self.target_val += order['origQty']
-                self.open_orders[oid]['executedQty'] = order['origQty']
-                self.open_orders[oid]['status'] = 'FILLED'
-        for oid in sr:
-            self.close_orders[oid] = self.open_orders[oid]
-            self.open_orders.pop(oid)
+            order['executedQty'] = order['origQty']
+            order['status'] = 'FILLED'
+            self.close_orders[oid] = order
+            self.push_order_event(order)
         self.cur_index += 1
+
+    def next_event(self):
+        # skip the ticks which can not deal any open order, then deal the next one
+        end = len(self.record) - 1
+        sell_price = self.sell_book[0][0] if self.sell_book else float('inf')
+        buy_price = self.buy_book[-1][0] if self.buy_book else float('-inf')
+        self.cur_index = self.record.find_cross(self.cur_index, end, sell_price, buy_price)
+        if self.cur_index < end:
+            self.next()
         
     def has_next(self):
         return self.cur_index + 1 < len(self.record)
@@ -55,10 +123,10 @@ class MockClient:
         return 0.00075
 
     def get_cur_sell(self, symbol):
-        return self.record[self.cur_index][0]
+        return self.record.ask_view[self.cur_index]
 
     def get_cur_buy(self, symbol):
-        return self.record[self.cur_index][1]
+        return self.record.bid_view[self.cur_index]
         
     def is_ok(self):
         return True
@@ -81,9 +149,21 @@ class MockClient:
 
     def cancel_order(self, symbol, order_id):
         if order_id in self.open_orders:
-            self.open_orders[order_id]['status'] = 'CANCELED'
-            self.close_orders[order_id] = self.open_orders[order_id]
-            self.open_orders.pop(order_id)
+            order = self.pop_open_order(order_id)
+            book = self.book_of(order['side'])
+            book.pop(bisect.bisect_left(book, self.book_keys.pop(order_id)))
+            order['status'] = 'CANCELED'
+            self.close_orders[order_id] = order
+            self.push_order_event(order)
+
+    def cancel_orders(self, symbol, order_ids):
+        for oid in order_ids:
+            self.cancel_order(symbol, oid)
+        return []
+
+    def cancel_all_orders(self, symbol):
+        self.cancel_orders(symbol, list(self.open_orders.keys()))
+        return []
 
     def create_limit_order(self, symbol, side, quantity, price, client_order_id, time_in_force = 'GTC'):
         order = {
@@ -98,8 +178,26 @@ class MockClient:
         }
         if client_order_id in self.open_orders or client_order_id in self.close_orders:
             raise Exception('duplicated order id')
+        key = (float(price), self.order_seq, client_order_id)
+        self.order_seq += 1
         self.open_orders[client_order_id] = order
+        sid = client_order_id.rsplit('_', 5)[0]
+        if sid not in self.strategy_orders:
+            self.strategy_orders[sid] = {}
+        self.strategy_orders[sid][client_order_id] = order
+        self.book_keys[client_order_id] = key
+        bisect.insort(self.book_of(side), key)
         return order
+
+    def create_batch_limit_orders(self, symbol, orders):
+        # a failed order is an error in its place, same as futures_place_batch_order
+        ret = []
+        for od in orders:
+            try:
+                ret.append(dict(self.create_limit_order(symbol, od['side'], od['quantity'], od['price'], od['client_order_id'])))
+            except Exception as e:
+                ret.append({'code': -1, 'msg': str(e)})
+        return ret
         
     def account_info(self):
         return None
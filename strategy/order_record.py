@@ -0,0 +1,86 @@
+#! /usr/bin/python3
+import numpy as np
+
+STATUS_NEW = 'NEW'
+STATUS_ERROR = 'ERROR'
+SIDE_SELL = 'SELL'
+
+# local view of one grid order, only the fields the strategy needs. The
+# fields are not changed after creation, the dumped form is made once
+class OrderRecord:
+    __slots__ = ('cid', 'side', 'flag_id', 'qty', 'price', 'status', 'packed')
+
+    def __init__(self, cid, side, flag_id, qty, price, status = STATUS_NEW):
+        self.cid = cid
+        self.side = side
+        self.flag_id = flag_id
+        self.qty = qty
+        self.price = price
+        self.status = status
+        self.packed = None
+
+    def __repr__(self):
+        return 'OrderRecord(%s %s %s %s %s %s)' % (
+            self.cid, self.side, self.flag_id, self.qty, self.price, self.status)
+
+    def dump(self):
+        # compact form kept in the state cache
+        if self.packed is None:
+            self.packed = (self.cid, self.side, self.flag_id, self.qty, self.price, self.status)
+        return self.packed
+
+    def to_order(self):
+        return {
+            'clientOrderId': self.cid,
+            'side': self.side,
+            'origQty': self.qty,
+            'price': self.price,
+            'status': self.status}
+
+    @classmethod
+    def load(cls, obj):
+        if isinstance(obj, dict):
+            return cls.from_order(obj)
+        return cls(*obj)
+
+    @classmethod
+    def from_order(cls, od):
+        # exchange order dict, the state of older versions is saved this way
+        # client order id is strategy_id, flag, qty int, qty dec, id, side
+        content = od['clientOrderId'].rsplit('_', 5)
+        return cls(od['clientOrderId'], od['side'], int(content[1]),
+                   float(content[2] + '.' + content[3]), float(od['price']),
+                   STATUS_ERROR if 'od_error' in od else STATUS_NEW)
+
+def order_cid(obj):
+    # clientOrderId of a dumped record or an exchange order dict
+    if isinstance(obj, dict):
+        return obj['clientOrderId']
+    return obj[0]
+
+# order count and sell count of every flag, kept in step with the open
+# orders so the missing grids are found without scanning them
+class FlagOccupancy:
+    def __init__(self, flag_num, orders = []):
+        self.reset(flag_num, orders)
+
+    def reset(self, flag_num, orders = []):
+        flag_num = max([flag_num] + [od.flag_id + 1 for od in orders])
+        self.orders = np.zeros(flag_num, dtype = np.int32)
+        self.sells = np.zeros(flag_num, dtype = np.int32)
+        for od in orders:
+            self.add(od)
+
+    def add(self, od):
+        self.orders[od.flag_id] += 1
+        if od.side == SIDE_SELL:
+            self.sells[od.flag_id] += 1
+
+    def remove(self, od):
+        self.orders[od.flag_id] -= 1
+        if od.side == SIDE_SELL:
+            self.sells[od.flag_id] -= 1
+
+    def missing(self, grid_num):
+        # grid i needs a buy when neither flag i has an order nor flag i + 1 a sell
+        return np.nonzero((self.orders[:grid_num] == 0) & (self.sells[1:grid_num + 1] == 0))[0].tolist()
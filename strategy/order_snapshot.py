@@ -0,0 +1,36 @@
+#! /usr/bin/python3
+import time
+import threading
+import logging as logger
+
+# open orders of a symbol fetched once and shared by every strategy on it,
+# indexed by the strategy id prefix of clientOrderId
+class OpenOrderSnapshot:
+    def __init__(self, max_age = 1.):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.symbol_locks = {}
+        self.snapshots = {}
+
+    def get_orders(self, client, symbol, strategy_id, min_time = 0.):
+        # min_time: the snapshot must be fetched after it, a strategy passes
+        # the time of its last order change so it always sees its own orders
+        with self.lock:
+            if symbol not in self.symbol_locks:
+                self.symbol_locks[symbol] = threading.Lock()
+            symbol_lock = self.symbol_locks[symbol]
+        with symbol_lock:
+            snap = self.snapshots.get(symbol)
+            if snap is None or snap[0] < min_time or time.time() - snap[0] > self.max_age:
+                st = time.time()
+                index = {}
+                for od in client.get_all_open_orders(symbol):
+                    # client order id is strategy_id, flag, qty int, qty dec, id, side
+                    sid = od['clientOrderId'].rsplit('_', 5)[0]
+                    if sid not in index:
+                        index[sid] = [od]
+                    else:
+                        index[sid].append(od)
+                snap = (st, index)
+                self.snapshots[symbol] = snap
+        return list(snap[1].get(strategy_id, []))
@@ -0,0 +1,125 @@
+#! /usr/bin/python3
+import os
+import sys
+import time
+import signal
+import threading
+import logging as logger
+
+# samples the stacks of the threads running a strategy phase, the stacks are
+# rooted at strategy id and phase and saved in the collapsed format read by
+# flamegraph.pl and speedscope.
+# cpu_timer samples on SIGPROF in the main thread instead of a sampler
+# thread, a sampler thread only gets the GIL when the busy thread releases
+# it and so sees a cpu bound backtest always sleeping
+class SamplingProfiler:
+    def __init__(self, interval = 0.005, cpu_timer = False):
+        self.interval = interval
+        self.cpu_timer = cpu_timer
+        self.tags = {}
+        self.stacks = {}
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.cpu_timer:
+            signal.signal(signal.SIGPROF, self.on_timer)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+            return
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def stop(self):
+        if self.cpu_timer:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, signal.SIG_DFL)
+            return
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def phase(self, strategy_id, name):
+        return ProfilePhase(self, strategy_id, name)
+
+    def on_timer(self, sig_num, frame):
+        frames = sys._current_frames()
+        frames[threading.main_thread().ident] = frame
+        self.sample(frames)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample(sys._current_frames())
+
+    def sample(self, frames):
+        for tid, tag in list(self.tags.items()):
+            frame = frames.get(tid)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                frame = frame.f_back
+            stack.extend(reversed(tag))
+            key = ';'.join(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def top(self, n = 20):
+        # samples of each phase, and the functions by own and total samples
+        phases, own, total = {}, {}, {}
+        for key, c in self.stacks.items():
+            frames = key.split(';')
+            tag = ';'.join(frames[:2])
+            phases[tag] = phases.get(tag, 0) + c
+            own[frames[-1]] = own.get(frames[-1], 0) + c
+            for f in set(frames[2:]):
+                total[f] = total.get(f, 0) + c
+        lines = ['samples %d, interval %sms' % (self.samples, self.interval * 1000)]
+        for title, counts in (('phase', phases), ('own', own), ('total', total)):
+            lines.append('top %s:' % title)
+            for k, c in sorted(counts.items(), key = lambda x: -x[1])[:n]:
+                lines.append('%6.2f%% %8d  %s' % (c * 100. / max(self.samples, 1), c, k))
+        return '\n'.join(lines)
+
+    def save(self, prefix, n = 20):
+        with open(prefix + '.folded', 'w') as fh:
+            for key, c in sorted(self.stacks.items()):
+                fh.write('%s %d\n' % (key, c))
+        summary = self.top(n)
+        with open(prefix + '.top.txt', 'w') as fh:
+            fh.write(summary + '\n')
+        logger.info('profile saved to %s.folded and %s.top.txt\n%s', prefix, prefix, summary)
+
+class ProfilePhase:
+    def __init__(self, profiler, strategy_id, name):
+        self.profiler = profiler
+        self.tag = (str(strategy_id), name)
+        self.prev = None
+
+    def __enter__(self):
+        tid = threading.get_ident()
+        self.prev = self.profiler.tags.get(tid)
+        self.profiler.tags[tid] = self.tag
+        return self
+
+    def __exit__(self, *exc):
+        tid = threading.get_ident()
+        if self.prev is None:
+            self.profiler.tags.pop(tid, None)
+        else:
+            self.profiler.tags[tid] = self.prev
+        return False
+
+def profile_phase(name):
+    # method decorator of GridRun, tags the calling thread while it runs
+    def wrap(func):
+        def phase_run(self, *args, **kwargs):
+            if self.profiler is None:
+                return func(self, *args, **kwargs)
+            with self.profiler.phase(self.strategy_id, name):
+                return func(self, *args, **kwargs)
+        phase_run.__name__ = func.__name__
+        return phase_run
+    return wrap
@@ -0,0 +1,67 @@
+#! /usr/bin/python3
+import os
+import time
+import logging as logger
+
+# best bid/ask of book ticker streams, one subscription per symbol shared by
+# every client and strategy reading the symbol
+class QuoteCache:
+    def __init__(self, stale_seconds = 5.):
+        self.stale_seconds = stale_seconds
+        self.symbols = set()
+        self.quotes = {}
+        # freshness is kept per connection, a dead socket must not be
+        # covered by the messages of the others
+        self.conn_of = {}
+        self.conn_symbols = []
+        self.conn_last_msg = []
+
+    def start(self, twm, symbols, futures = False):
+        new_symbols = sorted(set(symbols) - self.symbols)
+        if not new_symbols:
+            return
+        conn = len(self.conn_symbols)
+        self.conn_symbols.append(new_symbols)
+        self.conn_last_msg.append(0.)
+        callback = lambda msg: self.on_message(msg, conn)
+        streams = [s.lower() + '@bookTicker' for s in new_symbols]
+        if futures:
+            twm.start_futures_multiplex_socket(callback = callback, streams = streams)
+        else:
+            twm.start_multiplex_socket(callback = callback, streams = streams)
+        for s in new_symbols:
+            self.conn_of[s] = conn
+        self.symbols.update(new_symbols)
+
+    def on_message(self, msg, conn = 0):
+        data = msg.get('data', msg)
+        if data.get('e') == 'error':
+            logger.error('quote stream error %s of %s', data, self.conn_symbols[conn])
+            # rest is used until the connection is back
+            self.conn_last_msg[conn] = 0.
+            for s in self.conn_symbols[conn]:
+                self.quotes.pop(s, None)
+            return
+        if 's' not in data or 'a' not in data or 'b' not in data:
+            return
+        self.conn_last_msg[conn] = time.time()
+        # same form as the first level of get_order_book
+        self.quotes[data['s']] = ([data['a'], data['A']], [data['b'], data['B']])
+
+    def is_fresh(self, symbol):
+        # book ticker only pushes on change, a quiet symbol keeps its quote
+        # while its connection is alive
+        conn = self.conn_of.get(symbol)
+        return conn is not None and time.time() - self.conn_last_msg[conn] < self.stale_seconds
+
+    def get_cur_sell(self, symbol):
+        quote = self.quotes.get(symbol)
+        if quote is None or not self.is_fresh(symbol):
+            return None
+        return quote[0]
+
+    def get_cur_buy(self, symbol):
+        quote = self.quotes.get(symbol)
+        if quote is None or not self.is_fresh(symbol):
+            return None
+        return quote[1]
@@ -0,0 +1,110 @@
+#! /usr/bin/python3
+import os
+import math
+import time
+import threading
+import logging as logger
+
+PRIORITY_ORDER = 0
+PRIORITY_READ = 1
+
+# last response of each thread. python-binance keeps a single client.response,
+# the strategy threads sharing a client would read the response of another
+responses = threading.local()
+
+def capture_response(response, *args, **kwargs):
+    responses.last = response
+    return response
+
+def track_responses(client):
+    # response hook of the client session, once per client
+    session = getattr(client, 'session', None)
+    if session is not None and capture_response not in session.hooks['response']:
+        session.hooks['response'].append(capture_response)
+
+# request weight accounting of one api key, binance counts the weight in
+# fixed one minute windows and reports the used weight of the window in the
+# X-MBX-USED-WEIGHT-1M response header
+class RateLimiter:
+    def __init__(self, weight_limit = 1200, order_reserve = 0.2, interval = 60.):
+        self.weight_limit = weight_limit
+        # reads stop before the last part of the window, kept for order placement
+        self.read_limit = int(weight_limit * (1. - order_reserve))
+        self.interval = interval
+        self.cond = threading.Condition()
+        self.window = 0
+        self.used = 0
+        self.ban_until = 0.
+        self.inflight = {}
+
+    def wait_slot(self, weight, priority):
+        limit = self.weight_limit if priority == PRIORITY_ORDER else self.read_limit
+        with self.cond:
+            while True:
+                now = time.time()
+                window = int(now // self.interval)
+                if window != self.window:
+                    self.window = window
+                    self.used = 0
+                    self.cond.notify_all()
+                if now < self.ban_until:
+                    wait = self.ban_until - now
+                elif self.used + weight <= limit:
+                    self.used += weight
+                    return
+                else:
+                    wait = (window + 1) * self.interval - now
+                    logger.info('request weight %s/%s used, wait %.1fs', self.used, self.weight_limit, wait)
+                self.cond.wait(wait)
+
+    def update(self, response):
+        if response is None:
+            return
+        used = response.headers.get('X-MBX-USED-WEIGHT-1M')
+        with self.cond:
+            if used is not None:
+                self.used = max(self.used, int(used))
+            if response.status_code in (418, 429):
+                retry = int(response.headers.get('Retry-After', self.interval))
+                self.ban_until = max(self.ban_until, time.time() + retry)
+                logger.error('request limit hit %s, stop for %ss', response.status_code, retry)
+
+    def call(self, client, weight, priority, key, func, **params):
+        # the same read in flight is shared instead of sent again
+        if key is not None:
+            with self.cond:
+                if key in self.inflight:
+                    slot = self.inflight[key]
+                    is_owner = False
+                else:
+                    slot = self.inflight[key] = {'done': threading.Event()}
+                    is_owner = True
+            if not is_owner:
+                slot['done'].wait()
+                if 'error' in slot:
+                    raise slot['error']
+                return slot['result']
+        try:
+            self.wait_slot(weight, priority)
+            track_responses(client)
+            responses.last = None
+            try:
+                r = func(**params)
+            except Exception as e:
+                # a failed request carries its own response
+                response = getattr(e, 'response', None)
+                self.update(responses.last if response is None else response)
+                raise
+            self.update(responses.last)
+            if key is not None:
+                slot['result'] = r
+            return r
+        except Exception as e:
+            if key is not None:
+                slot['error'] = e
+            raise
+        finally:
+            if key is not None:
+                with self.cond:
+                    self.inflight.pop(key, None)
+                slot['done'].set()
@@ -0,0 +1,118 @@
+#! /usr/bin/python3
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging as logger
+
+# sources of the backtest result, a change of any of them is a new engine
+ENGINE_FILES = ['grid_v1.py', 'mock_client.py', 'tick_record.py', 'order_record.py', 'grid_eval.py']
+# config keys that do not change the result of a backtest
+IGNORED_KEYS = ('strategy_id', 'group', 'cache_type')
+
+engine = None
+
+def engine_version():
+    # the sources do not change under a running sweep, read them once
+    global engine
+    if engine is not None:
+        return engine
+    md = hashlib.sha256()
+    strategy_dir = os.path.dirname(os.path.realpath(__file__))
+    for fn in ENGINE_FILES:
+        with open(os.path.join(strategy_dir, fn), 'rb') as fh:
+            md.update(fh.read())
+    engine = md.hexdigest()[:16]
+    return engine
+
+def normalize_config(config):
+    return json.dumps(dict((k, v) for k, v in config.items() if k not in IGNORED_KEYS),
+                      sort_keys = True, separators = (',', ':'))
+
+# backtest gains of the sweeps keyed by the sha256 of the record content,
+# the record range, the mode, the normalized config and the engine version.
+# The least recently used results go when the rows exceed max_bytes
+class ResultCache:
+    def __init__(self, db_file, max_bytes = 256 << 20):
+        self.db_file = db_file
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(db_file)
+        self.db.executescript('''
+            create table if not exists result (
+                key text primary key, gain real, size integer, access real);
+            create index if not exists result_access on result (access);
+            create table if not exists record_hash (
+                path text primary key, size integer, mtime integer, digest text);
+        ''')
+        self.engine = engine_version()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.db.close()
+
+    def record_digest(self, record_file):
+        # hashed once per content, the record is only read again when it changed
+        path = os.path.abspath(record_file)
+        st = os.stat(path)
+        row = self.db.execute('select size, mtime, digest from record_hash where path = ?', (path, )).fetchone()
+        if row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        md = hashlib.sha256()
+        with open(path, 'rb') as fh:
+            for block in iter(lambda: fh.read(1 << 20), b''):
+                md.update(block)
+        digest = md.hexdigest()
+        with self.db:
+            self.db.execute('insert or replace into record_hash values (?, ?, ?, ?)',
+                            (path, st.st_size, st.st_mtime_ns, digest))
+        return digest
+
+    def key_prefix(self, record_file, max_line, target_symbol, base_symbol, fast):
+        return '%s:%s:%s:%s%s:%s:' % (self.engine, self.record_digest(record_file), max_line or 0,
+                                      target_symbol, base_symbol, 'eval' if fast else 'replay')
+
+    def result_key(self, prefix, config):
+        return hashlib.sha256((prefix + normalize_config(config)).encode()).hexdigest()
+
+    def get_many(self, keys):
+        # {key: gain} of the cached keys, their access time is renewed
+        found = {}
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            rows = self.db.execute('select key, gain from result where key in (%s)' % ','.join('?' * len(part)),
+                                   part).fetchall()
+            found.update(rows)
+        if found:
+            now = time.time()
+            with self.db:
+                self.db.executemany('update result set access = ? where key = ?', [(now, k) for k in found])
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        now = time.time()
+        with self.db:
+            self.db.executemany('insert or replace into result values (?, ?, ?, ?)',
+                                [(k, gain, len(k) + 8, now) for k, gain in items])
+        self.evict()
+
+    def evict(self):
+        total = self.db.execute('select coalesce(sum(size), 0) from result').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        drop = total - self.max_bytes
+        keys = []
+        for key, size in self.db.execute('select key, size from result order by access'):
+            keys.append((key, ))
+            drop -= size
+            if drop <= 0:
+                break
+        with self.db:
+            self.db.executemany('delete from result where key = ?', keys)
+        logger.info('result cache evict %s results', len(keys))
+
+    def hit_rate(self):
+        return self.hits / max(self.hits + self.misses, 1)
@@ -2,37 +2,97 @@
 import os
 from binance import Client, ThreadedWebsocketManager, ThreadedDepthCacheManager
 from binance.enums import HistoricalKlinesType
+from binance.exceptions import BinanceAPIException
 import math
 import time
 import logging as logger
 import json
 import signal
+from strategy.rate_limiter import PRIORITY_ORDER, PRIORITY_READ
+from strategy.metrics import timed_request
+from strategy.user_stream import parse_spot_event
+
+# request weight of the spot rest api
+REQUEST_WEIGHT = {
+    'get_order_book': 5,
+    'get_account': 20,
+    'get_open_orders': 6,
+    'get_order': 4,
+    'cancel_order': 1,
+    'cancel_all_open_orders': 1,
+    'create_order': 1,
+    'get_historical_klines': 2,
+}
 
 class BNClient:
+    # spot has no batch order api
+    batch_order_size = 1
+
     def __init__(self, client):
         self._client = client
+        self.order_events = None
+        self.quote_cache = None
+        self.rate_limiter = None
+
+    def set_quote_cache(self, quote_cache):
+        self.quote_cache = quote_cache
+
+    def set_rate_limiter(self, rate_limiter):
+        self.rate_limiter = rate_limiter
+
+    def request(self, func, priority = PRIORITY_READ, key = None, **params):
+        timed = timed_request(func)
+        if self.rate_limiter is None:
+            return timed(**params)
+        weight = REQUEST_WEIGHT.get(func.__name__, 1)
+        return self.rate_limiter.call(self._client, weight, priority, key, timed, **params)
+
+    def set_order_events(self, order_events):
+        self.order_events = order_events
+
+    def start_user_stream(self, twm, order_events):
+        # order_events is the OrderEventHub of the api key, shared by every
+        # client on the key through set_order_events
+        self.order_events = order_events
+        twm.start_user_socket(callback = self.on_user_event)
+
+    def on_user_event(self, msg):
+        self.order_events.on_message(msg, parse_spot_event)
+
+    def subscribe_order_events(self, prefix):
+        if self.order_events is None:
+            return None
+        return self.order_events.subscribe(prefix)
 
     def trade_fee(self):
         return 0.00075
 
     def get_cur_sell(self, symbol):
-        depth = self._client.get_order_book(symbol=symbol)
+        if self.quote_cache is not None:
+            r = self.quote_cache.get_cur_sell(symbol)
+            if r is not None:
+                return r
+        depth = self.request(self._client.get_order_book, key = ('get_order_book', symbol), symbol = symbol)
         if depth is None or 'asks' not in depth or len(depth['asks']) < 1:
             return None
         return depth['asks'][0]
 
     def get_cur_buy(self, symbol):
-        depth = self._client.get_order_book(symbol=symbol)
+        if self.quote_cache is not None:
+            r = self.quote_cache.get_cur_buy(symbol)
+            if r is not None:
+                return r
+        depth = self.request(self._client.get_order_book, key = ('get_order_book', symbol), symbol = symbol)
         if depth is None or 'bids' not in depth or len(depth['bids']) < 1:
             return None
         return depth['bids'][0]
 
     def is_ok(self):
-        r = self._client.get_account()
+        r = self.request(self._client.get_account, key = ('get_account', ))
         return r is not None and r.get('canTrade', False) is True;
 
     def get_asset_balance(self, symbol):
-        r = self._client.get_account()
+        r = self.request(self._client.get_account, key = ('get_account', ))
         if r is None or 'balances' not in r:
             return None
         for tp in r.get('balances', []):
@@ -41,20 +101,35 @@ class BNClient:
         return None
 
     def get_all_open_orders(self, symbol):
-        r = self._client.get_open_orders(symbol = symbol)
+        r = self.request(self._client.get_open_orders, key = ('get_open_orders', symbol), symbol = symbol)
         res = [x for x in r if x['symbol'] == symbol]
         return res
 
     def get_order(self, symbol, order_id):
-        r = self._client.get_order(symbol = symbol, origClientOrderId = order_id)
+        r = self.request(self._client.get_order, key = ('get_order', symbol, order_id),
+                         symbol = symbol, origClientOrderId = order_id)
         return r
 
     def cancel_order(self, symbol, order_id):
-        r = self._client.cancel_order(symbol = symbol, origClientOrderId = order_id)
+        r = self.request(self._client.cancel_order, priority = PRIORITY_ORDER,
+                         symbol = symbol, origClientOrderId = order_id)
+        return r
+
+    def cancel_orders(self, symbol, order_ids):
+        res = []
+        for oid in order_ids:
+            try:
+                res.append(self.cancel_order(symbol, oid))
+            except BinanceAPIException as e:
+                res.append({'code': e.code, 'msg': e.message})
+        return res
+
+    def cancel_all_orders(self, symbol):
+        r = self.request(self._client.cancel_all_open_orders, priority = PRIORITY_ORDER, symbol = symbol)
         return r
 
     def create_limit_order(self, symbol, side, quantity, price, client_order_id, time_in_force = 'GTC'):
-        r = self._client.create_order(
+        r = self.request(self._client.create_order, priority = PRIORITY_ORDER,
             symbol = symbol,
             side = side,
             quantity = quantity,
@@ -66,11 +141,11 @@ class BNClient:
         return r
         
     def account_info(self):
-        r = self._client.get_account()
+        r = self.request(self._client.get_account, key = ('get_account', ))
         print(r)
 
     def get_historical_klines(self, symbol, interval, start_str, end_str = None, limit = 500):
-        r = self._client.get_historical_klines(
+        r = self.request(self._client.get_historical_klines,
             symbol = symbol,
             interval = interval,
             start_str = start_str,
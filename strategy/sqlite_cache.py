@@ -0,0 +1,154 @@
+#! /usr/bin/python3
+import os
+import time
+import json
+import sqlite3
+import threading
+import logging as logger
+from strategy.order_record import OrderRecord
+
+SCHEMA = '''
+create table if not exists strategy (
+    strategy_id text primary key, grp text, symbol text,
+    total_gain real, unique_order_id integer, extra text, updated real);
+create index if not exists strategy_grp on strategy (grp);
+create table if not exists open_order (
+    strategy_id text, cid text, seq integer, side text, flag_id integer,
+    qty real, price real, status text, primary key (strategy_id, cid));
+create index if not exists open_order_seq on open_order (strategy_id, seq);
+create index if not exists open_order_price on open_order (strategy_id, side, price);
+'''
+# state keys with their own columns, the others go to extra as json
+STATE_KEYS = ('total_gain', 'unique_order_id')
+
+def default_db_file():
+    cache_dir = os.path.abspath(os.path.join(os.path.dirname(
+                os.path.realpath(__file__)), '../data'))
+    if not os.path.exists(cache_dir):
+        os.mkdir(cache_dir)
+    return os.path.join(cache_dir, 'state.db')
+
+# one WAL mode database of every strategy, a save is one transaction of
+# the changed rows. The connection is shared by the strategy threads
+class StateStore:
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_file, check_same_thread = False, timeout = 30)
+        self.db.execute('pragma journal_mode = wal')
+        # commits are not synced, a crash loses at most the last saves and
+        # never leaves a half written one
+        self.db.execute('pragma synchronous = normal')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def load(self, strategy_id):
+        # (state without open_orders, [(cid, seq, dumped order)]), None if never saved
+        with self.lock:
+            row = self.db.execute('select total_gain, unique_order_id, extra from strategy where strategy_id = ?',
+                                  (strategy_id, )).fetchone()
+            if row is None:
+                return None
+            orders = self.db.execute('select cid, seq, side, flag_id, qty, price, status from open_order '
+                                     'where strategy_id = ? order by seq', (strategy_id, )).fetchall()
+        content = json.loads(row[2]) if row[2] else {}
+        for k, v in zip(STATE_KEYS, row[:2]):
+            if v is not None:
+                content[k] = v
+        return content, [(od[0], od[1], (od[0], ) + tuple(od[2:])) for od in orders]
+
+    def save(self, strategy_id, group, symbol, content, dels, upserts):
+        extra = dict((k, v) for k, v in content.items() if k not in STATE_KEYS and k != 'open_orders')
+        with self.lock, self.db:
+            self.db.execute('insert or replace into strategy values (?, ?, ?, ?, ?, ?, ?)',
+                            (strategy_id, group, symbol, content.get('total_gain'), content.get('unique_order_id'),
+                             json.dumps(extra) if extra else None, time.time()))
+            if dels:
+                self.db.executemany('delete from open_order where strategy_id = ? and cid = ?',
+                                    [(strategy_id, cid) for cid in dels])
+            if upserts:
+                self.db.executemany('insert or replace into open_order values (?, ?, ?, ?, ?, ?, ?, ?)',
+                                    [(strategy_id, od[0], seq) + tuple(od[1:]) for seq, od in upserts])
+
+    def group_gains(self):
+        with self.lock:
+            return dict(self.db.execute('select grp, sum(total_gain) from strategy group by grp').fetchall())
+
+    def strategy_summary(self):
+        # strategy_id, group, symbol, gain, open buy orders, open sell orders
+        with self.lock:
+            return self.db.execute('''
+                select s.strategy_id, s.grp, s.symbol, s.total_gain,
+                       count(case when o.side = 'BUY' then 1 end), count(case when o.side = 'SELL' then 1 end)
+                from strategy s left join open_order o on o.strategy_id = s.strategy_id
+                group by s.strategy_id order by s.grp, s.strategy_id''').fetchall()
+
+stores = {}
+stores_lock = threading.Lock()
+
+def get_store(db_file = None):
+    db_file = os.path.abspath(db_file or default_db_file())
+    with stores_lock:
+        if db_file not in stores:
+            stores[db_file] = StateStore(db_file)
+        return stores[db_file]
+
+# state cache of one strategy in the shared StateStore, open orders are
+# saved by clientOrderId so a save only writes the orders that changed
+class SqliteCache:
+    def __init__(self, strategy_id, group = 'default', symbol = '', db_file = None):
+        self.strategy_id = strategy_id
+        self.group = group
+        self.symbol = symbol
+        self.store = get_store(db_file)
+        # clientOrderId to (seq, dumped order) of the saved open orders
+        self.orders = {}
+        self.seq = 0
+        loaded = self.store.load(strategy_id)
+        if loaded is None:
+            self.migrate(os.path.join(os.path.dirname(self.store.db_file), strategy_id + '.data'))
+            return
+        for cid, seq, od in loaded[1]:
+            self.orders[cid] = (seq, od)
+            self.seq = max(self.seq, seq + 1)
+
+    def migrate(self, cache_file_name):
+        # from the file cache
+        if not os.path.exists(cache_file_name):
+            return
+        with open(cache_file_name, 'r') as fh:
+            con = fh.read()
+        if len(con) < 2:
+            return
+        self.save_local_cache(json.loads(con))
+        logger.info('migrate %s to %s', cache_file_name, self.store.db_file)
+
+    def get_local_cache(self):
+        loaded = self.store.load(self.strategy_id)
+        if loaded is None:
+            return {}
+        content, orders = loaded
+        content['open_orders'] = [list(od) for _, _, od in orders]
+        return content
+
+    def save_local_cache(self, content):
+        # like the journal cache the orders load back in the order they were
+        # first saved, GridRun does not keep an order of its open orders
+        orders = [OrderRecord.load(od).dump() for od in content.get('open_orders', [])]
+        cids = set(od[0] for od in orders)
+        dels = [cid for cid in self.orders if cid not in cids]
+        new_orders = {}
+        upserts = []
+        for od in orders:
+            seq, old = self.orders.get(od[0], (None, None))
+            if seq is None:
+                seq = self.seq
+                self.seq += 1
+            new_orders[od[0]] = (seq, tuple(od))
+            if old != tuple(od):
+                upserts.append(new_orders[od[0]])
+        self.store.save(self.strategy_id, self.group, self.symbol, content, dels, upserts)
+        self.orders = new_orders
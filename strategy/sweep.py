@@ -0,0 +1,197 @@
+#! /usr/bin/python3
+import os
+import csv
+import json
+import itertools
+import contextlib
+import multiprocessing
+import logging as logger
+from strategy.tick_record import TickRecord
+from strategy.mock_client import MockClient
+from strategy.grid_v1 import GridRun
+from strategy.grid_eval import eval_grid
+from strategy.checkpoint import Checkpoint, RecordDigest, checkpoint_file
+
+# record shared read only by the forked workers, with its prefix digests
+# when the backtests are checkpointed
+shared_record = None
+shared_digest = None
+
+def expand_grid(base_config, grid):
+    keys = list(grid.keys())
+    for values in itertools.product(*[grid[k] for k in keys]):
+        config = dict(base_config)
+        config.update(zip(keys, values))
+        yield config
+
+def load_checkpoint(record, configs, target_symbol, base_symbol, checkpoint_dir, profiler, record_digest):
+    # (checkpoint, mock_client, runners), mock_client is None when nothing to resume
+    if not checkpoint_dir:
+        return None, None, None
+    if record_digest is None:
+        record_digest = RecordDigest(record)
+    ckpt = Checkpoint(checkpoint_file(checkpoint_dir, configs, target_symbol, base_symbol), record_digest)
+    restored = ckpt.load()
+    if restored is None:
+        return ckpt, None, None
+    mock_client, runners = restored
+    for runner in runners:
+        if runner is not None:
+            runner.profiler = profiler
+    return ckpt, mock_client, runners
+
+def run_backtest(record, config, target_symbol, base_symbol, profiler = None, checkpoint_dir = None,
+                 record_digest = None, keep_checkpoint = True):
+    ckpt, mock_client, runners = load_checkpoint(record, [config], target_symbol, base_symbol,
+                                                 checkpoint_dir, profiler, record_digest)
+    if mock_client is None:
+        config = dict(config)
+        config['cache_type'] = 'mem'
+        mock_client = MockClient(record, target_symbol, base_symbol)
+        runner = GridRun(client = mock_client, config = config, verbose = False, profiler = profiler)
+        runner.order_sleep = 0.
+    else:
+        runner = runners[0]
+    # time out of the strategy phases goes to the mock client
+    phase = contextlib.nullcontext() if profiler is None else profiler.phase(runner.strategy_id, 'mock_next')
+    with phase:
+        while mock_client.has_next():
+            runner.work_loop()
+            mock_client.next_event()
+            if ckpt is not None:
+                ckpt.save(mock_client, [runner])
+    if ckpt is not None:
+        ckpt.finish(mock_client, [runner], keep_checkpoint)
+    return runner.get_total_gain()
+
+def run_multiplex(record, configs, target_symbol, base_symbol, profiler = None, checkpoint_dir = None,
+                  record_digest = None, keep_checkpoint = True):
+    # one pass of a shared MockClient drives every config, each GridRun in
+    # its own strategy id. After a tick only the GridRuns whose orders dealt
+    # run work_loop, the others would find nothing changed. Returns the
+    # gain of each config, None for a config GridRun refuses
+    ckpt, mock_client, runners = load_checkpoint(record, configs, target_symbol, base_symbol,
+                                                 checkpoint_dir, profiler, record_digest)
+    if mock_client is None:
+        mock_client = MockClient(record, target_symbol, base_symbol)
+        runners = []
+        for i, config in enumerate(configs):
+            config = dict(config)
+            config['cache_type'] = 'mem'
+            config['strategy_id'] = '%sm%d' % (config['strategy_id'], i)
+            try:
+                runner = GridRun(client = mock_client, config = config, verbose = False,
+                                 order_snapshot = mock_client, profiler = profiler)
+                runner.order_sleep = 0.
+            except Exception as e:
+                logger.error('backtest failed of %s: %s', config, e)
+                runner = None
+            runners.append(runner)
+        mock_client.touched.update(runner.strategy_id for runner in runners if runner is not None)
+    runner_of = dict((runner.strategy_id, runner) for runner in runners if runner is not None)
+    phase = contextlib.nullcontext() if profiler is None else profiler.phase('multiplex', 'mock_next')
+    with phase:
+        while mock_client.has_next():
+            for sid in mock_client.pop_touched():
+                runner_of[sid].work_loop()
+            mock_client.next_event()
+            if ckpt is not None:
+                ckpt.save(mock_client, runners)
+    if ckpt is not None:
+        ckpt.finish(mock_client, runners, keep_checkpoint)
+    return [None if runner is None else runner.get_total_gain() for runner in runners]
+
+def run_eval(record, config, target_symbol, base_symbol):
+    trade_fee = MockClient(record, target_symbol, base_symbol).trade_fee()
+    return eval_grid(record, config, trade_fee)
+
+def sweep_worker(args, profiler = None):
+    config, target_symbol, base_symbol, fast, checkpoint_dir, keep_checkpoint = args
+    if isinstance(config, list):
+        # a batch of configs multiplexed on one record pass
+        try:
+            return list(zip(config, run_multiplex(shared_record, config, target_symbol, base_symbol, profiler,
+                                                  checkpoint_dir, shared_digest, keep_checkpoint)))
+        except Exception as e:
+            logger.error('backtest failed of %s configs: %s', len(config), e)
+            return [(cfg, None) for cfg in config]
+    try:
+        if fast:
+            return config, run_eval(shared_record, config, target_symbol, base_symbol)
+        return config, run_backtest(shared_record, config, target_symbol, base_symbol, profiler, checkpoint_dir,
+                                    shared_digest, keep_checkpoint)
+    except Exception as e:
+        logger.error('backtest failed of %s: %s', config, e)
+        return config, None
+
+def run_sweep(record_file, target_symbol, base_symbol, base_config, grid, processes = None, max_line = 100000,
+              fast = False, profiler = None, multiplex = 0, result_cache = None, checkpoint_dir = None,
+              keep_checkpoints = False):
+    global shared_record, shared_digest
+    results = []
+    configs = list(expand_grid(base_config, grid))
+    cached = {}
+    if result_cache is not None:
+        # configs evaluated by an earlier sweep are not run again
+        prefix = result_cache.key_prefix(record_file, max_line, target_symbol, base_symbol, fast)
+        keys = [result_cache.result_key(prefix, config) for config in configs]
+        cached = result_cache.get_many(keys)
+        for config, key in zip(configs, keys):
+            if key in cached:
+                res = dict((k, config[k]) for k in grid.keys())
+                res['gain'] = cached[key]
+                results.append(res)
+        logger.info('result cache hit %s of %s configs, hit rate %.1f%%', len(results), len(configs),
+                    100. * len(results) / max(len(configs), 1))
+        configs = [config for config, key in zip(configs, keys) if key not in cached]
+        if not configs:
+            return sorted(results, key = lambda x: -x['gain'])
+    shared_record = TickRecord(record_file, max_line)
+    shared_record.build_index()
+    shared_digest = None
+    if fast:
+        checkpoint_dir = None
+    elif checkpoint_dir:
+        # hashed once here, not by every backtest
+        shared_digest = RecordDigest(shared_record)
+    tasks = [(config, target_symbol, base_symbol, fast, checkpoint_dir, keep_checkpoints) for config in configs]
+    if multiplex > 1 and not fast:
+        tasks = [(configs[i:i + multiplex], target_symbol, base_symbol, fast, checkpoint_dir, keep_checkpoints)
+                 for i in range(0, len(configs), multiplex)]
+    if profiler is not None:
+        # profiled in this process, the sampler does not see the pool workers
+        logger.info('sweep %s configs with profiler', len(tasks))
+        outputs = (sweep_worker(task, profiler) for task in tasks)
+    else:
+        logger.info('sweep %s configs with %s processes', len(tasks), processes or os.cpu_count())
+        pool = multiprocessing.get_context('fork').Pool(processes)
+        outputs = pool.imap_unordered(sweep_worker, tasks)
+    for output in outputs:
+        new_results = []
+        for config, gain in (output if isinstance(output, list) else [output]):
+            if gain is None:
+                continue
+            res = dict((k, config[k]) for k in grid.keys())
+            res['gain'] = gain
+            logger.info('%s', res)
+            results.append(res)
+            new_results.append((config, gain))
+        if result_cache is not None:
+            # stored as they come, a crashed sweep keeps what it finished
+            result_cache.put_many([(result_cache.result_key(prefix, config), gain) for config, gain in new_results])
+    if profiler is None:
+        pool.close()
+        pool.join()
+    return sorted(results, key = lambda x: -x['gain'])
+
+def save_results(results, output_file):
+    if output_file.endswith('.csv'):
+        with open(output_file, 'w', newline = '') as fh:
+            if not results:
+                return
+            writer = csv.DictWriter(fh, fieldnames = list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(output_file, 'w') as fh:
+            fh.write(json.dumps(results, indent = 4) + '\n')
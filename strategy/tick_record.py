@@ -0,0 +1,105 @@
+#! /usr/bin/python3
+import os
+import math
+import time
+import struct
+import logging as logger
+from array import array
+import numpy as np
+
+# binary record: header then float64 columns of time, ask, bid
+RECORD_MAGIC = b'GRIDREC1'
+RECORD_HEADER = struct.Struct('<8s16sQ32x')
+
+def is_binary_record(record_file):
+    with open(record_file, 'rb') as fh:
+        return fh.read(len(RECORD_MAGIC)) == RECORD_MAGIC
+
+def read_record_header(record_file):
+    with open(record_file, 'rb') as fh:
+        magic, symbol, rows = RECORD_HEADER.unpack(fh.read(RECORD_HEADER.size))
+    if magic != RECORD_MAGIC:
+        raise Exception('not a binary record file %s' % record_file)
+    return symbol.rstrip(b'\0').decode(), rows
+
+def write_binary_record(record_file, symbol, times, asks, bids):
+    with open(record_file, 'wb') as fh:
+        fh.write(RECORD_HEADER.pack(RECORD_MAGIC, symbol.encode(), len(times)))
+        for col in (times, asks, bids):
+            array('d', col).tofile(fh)
+
+def convert_text_record(text_file, record_file, symbol):
+    times, asks, bids = array('d'), array('d'), array('d')
+    with open(text_file, 'r') as fh:
+        for line in fh:
+            content = line.split(' ')
+            if len(content) < 3:
+                continue
+            times.append(float(content[0]))
+            asks.append(float(content[1]))
+            bids.append(float(content[2]))
+    write_binary_record(record_file, symbol, times, asks, bids)
+    return len(times)
+
+class TickRecord:
+    def __init__(self, record_file, max_line = 100000, block_size = 256):
+        self.symbol = ''
+        if is_binary_record(record_file):
+            # columns are memory mapped, nothing is loaded until touched
+            self.symbol, rows = read_record_header(record_file)
+            cols = np.memmap(record_file, dtype = '<f8', mode = 'r',
+                             offset = RECORD_HEADER.size, shape = (3, rows))
+            self.times, self.asks, self.bids = cols[0], cols[1], cols[2]
+        else:
+            times, asks, bids = array('d'), array('d'), array('d')
+            with open(record_file, 'r') as fh:
+                for line in fh:
+                    if max_line and len(times) >= max_line:
+                        break
+                    content = line.split(' ')
+                    times.append(float(content[0]))
+                    asks.append(float(content[1]))
+                    bids.append(float(content[2]))
+            self.times = np.frombuffer(times, dtype = np.float64)
+            self.asks = np.frombuffer(asks, dtype = np.float64)
+            self.bids = np.frombuffer(bids, dtype = np.float64)
+        if max_line:
+            self.times = self.times[:max_line]
+            self.asks = self.asks[:max_line]
+            self.bids = self.bids[:max_line]
+        # memoryview read a tick as python float, faster than numpy scalar
+        self.ask_view = memoryview(self.asks)
+        self.bid_view = memoryview(self.bids)
+        self.block_size = block_size
+        self.ask_block_max = None
+        self.bid_block_min = None
+
+    def __len__(self):
+        return len(self.asks)
+
+    def build_index(self):
+        # max ask and min bid of every block, a block without any price
+        # crossing the order book can be skipped as a whole
+        starts = np.arange(0, len(self.asks), self.block_size)
+        if len(starts) == 0:
+            self.ask_block_max, self.bid_block_min = [], []
+            return
+        self.ask_block_max = np.maximum.reduceat(self.asks, starts).tolist()
+        self.bid_block_min = np.minimum.reduceat(self.bids, starts).tolist()
+
+    def find_cross(self, start, end, sell_price, buy_price):
+        # first index in [start, end) with ask > sell_price or bid < buy_price, end if not found
+        if self.ask_block_max is None:
+            self.build_index()
+        asks, bids, bs = self.ask_view, self.bid_view, self.block_size
+        i = start
+        while i < end:
+            if i % bs == 0:
+                b = i // bs
+                if self.ask_block_max[b] <= sell_price and self.bid_block_min[b] >= buy_price:
+                    i += bs
+                    continue
+            if asks[i] > sell_price or bids[i] < buy_price:
+                return i
+            i += 1
+        return end
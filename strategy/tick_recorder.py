@@ -0,0 +1,211 @@
+#! /usr/bin/python3
+import os
+import math
+import time
+import zlib
+import random
+import struct
+import threading
+import logging as logger
+import numpy as np
+from strategy.tick_record import write_binary_record
+
+# tick chunk file: chunks appended one after another, each a header then a
+# zlib compressed payload of int64 columns time (ms), ask and bid (price in
+# units of 10^-decimals), every column delta encoded from 0
+CHUNK_MAGIC = b'TCK1'
+CHUNK_HEADER = struct.Struct('<4sIII')
+MAX_DECIMALS = 10
+# streams of one websocket connection allowed by binance
+MAX_CONNECTION_STREAMS = 1024
+
+ROTATE_SECONDS = {
+    'hour': (3600, '%Y%m%d%H'),
+    'day': (86400, '%Y%m%d'),
+}
+
+def price_decimals(prices):
+    # fewest decimals that keep every price exact
+    for d in range(MAX_DECIMALS + 1):
+        scaled = prices * 10 ** d
+        if np.all(np.abs(scaled - np.rint(scaled)) < 1e-6):
+            return d
+    return MAX_DECIMALS
+
+def encode_chunk(times, asks, bids):
+    decimals = max(price_decimals(asks), price_decimals(bids))
+    cols = [np.rint(times * 1000.).astype(np.int64),
+            np.rint(asks * 10 ** decimals).astype(np.int64),
+            np.rint(bids * 10 ** decimals).astype(np.int64)]
+    payload = zlib.compress(np.concatenate([np.diff(c, prepend = 0) for c in cols]).astype('<i8').tobytes())
+    return CHUNK_HEADER.pack(CHUNK_MAGIC, len(times), decimals, len(payload)) + payload
+
+def read_tick_chunks(chunk_file):
+    # times in seconds, asks, bids; a torn chunk at the end is skipped
+    times, asks, bids = [], [], []
+    with open(chunk_file, 'rb') as fh:
+        data = fh.read()
+    pos = 0
+    while pos + CHUNK_HEADER.size <= len(data):
+        magic, rows, decimals, size = CHUNK_HEADER.unpack_from(data, pos)
+        if magic != CHUNK_MAGIC:
+            raise Exception('bad tick chunk in %s at %s' % (chunk_file, pos))
+        pos += CHUNK_HEADER.size
+        if pos + size > len(data):
+            logger.error('torn tick chunk in %s at %s', chunk_file, pos)
+            break
+        cols = np.cumsum(np.frombuffer(zlib.decompress(data[pos:pos + size]), dtype = '<i8').reshape(3, rows), axis = 1)
+        pos += size
+        times.append(cols[0] / 1000.)
+        asks.append(cols[1] / 10. ** decimals)
+        bids.append(cols[2] / 10. ** decimals)
+    if not times:
+        return np.zeros(0), np.zeros(0), np.zeros(0)
+    return np.concatenate(times), np.concatenate(asks), np.concatenate(bids)
+
+# records the book ticker streams of many symbols. on_message only keeps the
+# changed best prices in memory, flush encodes them per symbol and appends a
+# chunk to the file of the rotation period
+class TickRecorder:
+    def __init__(self, out_dir, rotate = 'hour', flush_interval = 5.):
+        if rotate not in ROTATE_SECONDS:
+            raise Exception('unsupport rotate %s' % rotate)
+        self.out_dir = out_dir
+        self.rotate = rotate
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.buffers = {}
+        self.last = {}
+        self.ticks = 0
+        self.last_msg = 0.
+
+    def start(self, twm, symbols, futures = False):
+        streams = [s.lower() + '@bookTicker' for s in sorted(set(symbols))]
+        for i in range(0, len(streams), MAX_CONNECTION_STREAMS):
+            if futures:
+                twm.start_futures_multiplex_socket(callback = self.on_message,
+                                                   streams = streams[i:i + MAX_CONNECTION_STREAMS])
+            else:
+                twm.start_multiplex_socket(callback = self.on_message,
+                                           streams = streams[i:i + MAX_CONNECTION_STREAMS])
+
+    def on_message(self, msg):
+        data = msg.get('data', msg)
+        s = data.get('s')
+        if s is None or 'a' not in data or 'b' not in data:
+            if data.get('e') == 'error':
+                logger.error('record stream error %s', data)
+            return
+        now = time.time()
+        self.last_msg = now
+        quote = (data['a'], data['b'])
+        if self.last.get(s) == quote:
+            # only the quantity changed
+            return
+        self.last[s] = quote
+        # futures carry the event time, spot book ticker has none
+        t = data['E'] / 1000. if 'E' in data else now
+        with self.lock:
+            buf = self.buffers.get(s)
+            if buf is None:
+                buf = self.buffers[s] = []
+            buf.append((t, quote[0], quote[1]))
+            self.ticks += 1
+
+    def chunk_file(self, symbol, period_start):
+        fmt = ROTATE_SECONDS[self.rotate][1]
+        return os.path.join(self.out_dir, symbol, '%s-%s.tck' % (symbol, time.strftime(fmt, time.gmtime(period_start))))
+
+    def flush(self):
+        with self.lock:
+            buffers, self.buffers = self.buffers, {}
+        period = ROTATE_SECONDS[self.rotate][0]
+        for symbol, buf in buffers.items():
+            times = np.array([b[0] for b in buf], dtype = np.float64)
+            asks = np.array([b[1] for b in buf], dtype = np.float64)
+            bids = np.array([b[2] for b in buf], dtype = np.float64)
+            keys = (times // period).astype(np.int64)
+            # a buffer crossing the rotation goes to two files
+            cuts = np.flatnonzero(np.diff(keys)) + 1
+            for st, ed in zip(np.concatenate([[0], cuts]), np.concatenate([cuts, [len(buf)]])):
+                chunk_file = self.chunk_file(symbol, keys[st] * period)
+                if not os.path.exists(os.path.dirname(chunk_file)):
+                    os.makedirs(os.path.dirname(chunk_file))
+                with open(chunk_file, 'ab') as fh:
+                    fh.write(encode_chunk(times[st:ed], asks[st:ed], bids[st:ed]))
+        return sum(len(buf) for buf in buffers.values())
+
+    def run(self, is_stop):
+        # flush every flush_interval until is_stop() and once more at the end
+        st = time.time()
+        while not is_stop():
+            time.sleep(0.1)
+            if time.time() - st < self.flush_interval:
+                continue
+            st = time.time()
+            n = self.flush()
+            logger.info('record %s ticks of %s symbols', n, len(self.last))
+        self.flush()
+
+# stands for ThreadedWebsocketManager in tests: pushes random book ticker
+# messages of the subscribed symbols from one thread, rate per symbol
+class FakeTickStream:
+    def __init__(self, rate = 10., seed = 1):
+        self.rate = rate
+        self.rnd = random.Random(seed)
+        self.subs = []
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.sent = 0
+
+    def start(self):
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def start_multiplex_socket(self, callback, streams):
+        self.subs.append((callback, streams, False))
+
+    def start_futures_multiplex_socket(self, callback, streams):
+        self.subs.append((callback, streams, True))
+
+    def messages(self, streams, futures, prices):
+        for stream in streams:
+            symbol = stream.split('@')[0].upper()
+            price = prices.get(symbol, 100. + self.rnd.random() * 100.)
+            price = prices[symbol] = max(price * (1. + self.rnd.gauss(0, 0.0005)), 0.01)
+            data = {
+                'u': self.sent, 's': symbol,
+                'b': '%.2f' % (price * 0.9999), 'B': '1.00000000',
+                'a': '%.2f' % (price * 1.0001), 'A': '1.00000000'}
+            if futures:
+                data.update({'e': 'bookTicker', 'E': int(time.time() * 1000)})
+            yield {'stream': stream, 'data': data}
+
+    def run(self):
+        prices = {}
+        interval = 1. / self.rate
+        while not self.stop_event.is_set():
+            st = time.time()
+            for callback, streams, futures in self.subs:
+                for msg in self.messages(streams, futures, prices):
+                    callback(msg)
+                    self.sent += 1
+            self.stop_event.wait(max(interval - (time.time() - st), 0.))
+
+def convert_chunk_record(chunk_path, record_file, symbol):
+    # a chunk file or a directory of them, files of later periods sort later
+    if os.path.isdir(chunk_path):
+        chunk_files = sorted(os.path.join(chunk_path, f) for f in os.listdir(chunk_path) if f.endswith('.tck'))
+    else:
+        chunk_files = [chunk_path]
+    cols = [read_tick_chunks(f) for f in chunk_files]
+    times = np.concatenate([c[0] for c in cols]) if cols else np.zeros(0)
+    asks = np.concatenate([c[1] for c in cols]) if cols else np.zeros(0)
+    bids = np.concatenate([c[2] for c in cols]) if cols else np.zeros(0)
+    write_binary_record(record_file, symbol, times, asks, bids)
+    return len(times)
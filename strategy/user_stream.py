@@ -0,0 +1,70 @@
+#! /usr/bin/python3
+import os
+import time
+import queue
+import threading
+import logging as logger
+
+# order events of the user data stream, normalized to the keys of an order
+# returned by get_order so GridRun handles both the same way
+
+def parse_spot_event(msg):
+    if msg.get('e') != 'executionReport':
+        return None
+    cid = msg.get('c')
+    if msg.get('X') == 'CANCELED' and msg.get('C'):
+        cid = msg.get('C')
+    return {
+        'symbol': msg.get('s'),
+        'clientOrderId': cid,
+        'side': msg.get('S'),
+        'status': msg.get('X'),
+        'origQty': msg.get('q'),
+        'executedQty': msg.get('z'),
+        'price': msg.get('p'),
+        'time': msg.get('T', msg.get('E')),
+    }
+
+def parse_future_event(msg):
+    if msg.get('e') != 'ORDER_TRADE_UPDATE' or 'o' not in msg:
+        return None
+    od = msg['o']
+    return {
+        'symbol': od.get('s'),
+        'clientOrderId': od.get('c'),
+        'side': od.get('S'),
+        'status': od.get('X'),
+        'origQty': od.get('q'),
+        'executedQty': od.get('z'),
+        'price': od.get('p'),
+        'time': od.get('T', msg.get('T')),
+    }
+
+class OrderEventHub:
+    def __init__(self, notify = None):
+        self.notify = notify
+        self.lock = threading.Lock()
+        self.listeners = {}
+
+    def subscribe(self, prefix):
+        with self.lock:
+            if prefix not in self.listeners:
+                self.listeners[prefix] = queue.Queue()
+            return self.listeners[prefix]
+
+    def dispatch(self, event):
+        cid = event.get('clientOrderId') or ''
+        with self.lock:
+            for prefix, q in self.listeners.items():
+                if cid.startswith(prefix):
+                    q.put(event)
+        if self.notify is not None:
+            self.notify.set()
+
+    def on_message(self, msg, parser):
+        if msg.get('e') == 'error':
+            logger.error('user stream error %s', msg)
+            return
+        event = parser(msg)
+        if event is not None:
+            self.dispatch(event)